@@ -1,3 +1,26 @@
 from .directed_graph import Graph
+from .label_cache import LabelCache
+from .null_graph import NullGraph, NULL_GRAPH
 
-__all__ = ["Graph"]
\ No newline at end of file
+# Imported on first access, thus 'import easygraph' only loads what is needed for recording
+_LAZY = {"Journal": ".journal",
+         "CallRecorder": ".profiler",
+         "render_many": ".render",
+         "RenderCache": ".render_cache",
+         "EveryNth": ".sampling",
+         "FirstThenEvery": ".sampling",
+         "Probability": ".sampling",
+         "TimeBudget": ".sampling"}
+
+
+def __getattr__(name:str):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["Graph", "LabelCache", "NullGraph", "NULL_GRAPH", "render_many", "RenderCache", "CallRecorder", "Journal",
+           "EveryNth", "FirstThenEvery", "Probability", "TimeBudget"]
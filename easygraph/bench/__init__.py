@@ -0,0 +1,20 @@
+"""
+Benchmarks of easygraph itself, for measuring the performance at scale and comparing versions:
+
+    python -m easygraph.bench --sizes 1000,10000 --output before.json
+    python -m easygraph.bench --sizes 1000,10000 --output after.json --compare before.json
+
+The workloads (see workloads.py) are flat chains, wide fan-ins with 'connect_from' lists, 10 nested clusters and
+text-heavy labels. For each of them and each size, the seconds of each phase, the nodes added per second and the
+peak of allocated memory are reported. Also, the time of 'import easygraph' is checked against a budget, since it
+is paid by every short-lived tool and worker (exit code 1 if exceeded):
+
+    python -m easygraph.bench --import-only --import-budget 30
+
+The overhead of recording a block with Graph.step() is compared with an empty 'with' block, the calls of a graph
+while many other graphs are alive with the same calls without them, the estimated total time of a sampled loop
+with the time it took, and the calls of a disabled graph (Graph(enabled=False)) with calls of an empty function.
+"""
+from .runner import (run, run_one, compare, import_time, disabled_overhead, step_overhead, graphs_overhead,
+                     sampling_accuracy, SIZES, IMPORT_BUDGET, DISABLED_BUDGET, STEP_BUDGET, GRAPHS_ALIVE)
+from .workloads import WORKLOADS
@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+
+from .runner import (run, compare, import_time, format_import, disabled_overhead, format_disabled, step_overhead,
+                     format_step, graphs_overhead, format_graphs, sampling_accuracy,
+                     format_sampling, SIZES, IMPORT_BUDGET, DISABLED_BUDGET, STEP_BUDGET,
+                     GRAPHS_ALIVE)
+from .workloads import WORKLOADS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m easygraph.bench", description="Benchmarks of easygraph")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help=f"comma separated workloads (default: {','.join(WORKLOADS)})")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help=f"comma separated numbers of nodes (default: {','.join(map(str, SIZES))})")
+    parser.add_argument("--render-max", type=int, default=10_000,
+                        help="graphs with more nodes are not rendered (default: 10000)")
+    parser.add_argument("--no-memory", action="store_true", help="do not measure the peak memory")
+    parser.add_argument("--output", default="easygraph_bench.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET * 1e3,
+                        help=f"maximal milliseconds of 'import easygraph' (default: {IMPORT_BUDGET * 1e3:.0f})")
+    parser.add_argument("--import-only", action="store_true", help="only check the import time")
+    parser.add_argument("--disabled-budget", type=float, default=DISABLED_BUDGET,
+                        help=f"maximal nanoseconds a call of a disabled graph may take longer than an empty call "
+                             f"(default: {DISABLED_BUDGET})")
+    parser.add_argument("--step-budget", type=float, default=STEP_BUDGET,
+                        help=f"maximal nanoseconds a recorded step may take longer than an empty 'with' block "
+                             f"(default: {STEP_BUDGET})")
+    parser.add_argument("--graphs", type=int, default=GRAPHS_ALIVE,
+                        help=f"number of other graphs alive while the calls of a graph are measured again "
+                             f"(default: {GRAPHS_ALIVE})")
+    args = parser.parse_args(argv)
+
+    workloads = [w for w in args.workloads.split(",") if w]
+    unknown = set(workloads) - WORKLOADS.keys()
+    if unknown:
+        parser.error(f"unknown workloads: {sorted(unknown)}")
+
+    # The import time is checked first, the exit code is 1 if it exceeds the budget
+    imported = import_time(budget=args.import_budget / 1e3)
+    print(format_import(imported))
+    if args.import_only:
+        return 0 if imported["ok"] else 1
+
+    # The overhead of a recorded step, its independence of the number of graphs, the estimated time of a sampled
+    # loop and the overhead of a disabled graph (Graph(enabled=False)) are reported, not enforced, since they are
+    # noisy
+    step = step_overhead(budget=args.step_budget)
+    print(format_step(step))
+    graphs = graphs_overhead(graphs=args.graphs)
+    print(format_graphs(graphs))
+    sampling = sampling_accuracy()
+    print(format_sampling(sampling))
+    disabled = disabled_overhead(budget=args.disabled_budget)
+    print(format_disabled(disabled))
+
+    results = run(workloads, [int(n) for n in args.sizes.split(",") if n], render_max=args.render_max,
+                  memory=not args.no_memory)
+    results["import"] = imported
+    results["step"] = step
+    results["graphs"] = graphs
+    results["sampling"] = sampling
+    results["disabled"] = disabled
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"Compared with {args.compare} (new/old):")
+        for line in compare(old, results):
+            print(line)
+    return 0 if imported["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
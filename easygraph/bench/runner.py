@@ -0,0 +1,388 @@
+"""
+For running the workloads and measuring each phase: formatting the labels, adding the nodes, create(), generating
+the DOT source and rendering it.
+"""
+import gc
+import io
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from ..directed_graph import Graph
+from ..formatting import format_label, TITLE_COLOURS
+from ..timing import MAX_PENDING
+from .workloads import WORKLOADS, texts
+
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# The maximal seconds of 'import easygraph' in a fresh interpreter
+IMPORT_BUDGET = 0.05
+
+# Modules which are not needed for recording, thus must not be loaded by 'import easygraph'
+HEAVY_MODULES = ("graphviz", "asyncio", "subprocess", "json", "tracemalloc", "inspect", "re")
+
+# The maximal nanoseconds a call of a disabled graph may take longer than a call of an empty function
+DISABLED_BUDGET = 150
+
+# The maximal nanoseconds a recorded step (Graph.step()) may take longer than an empty 'with' block
+STEP_BUDGET = 1000
+
+# The maximal relative error of the estimated total time of a sampled loop
+SAMPLING_TOLERANCE = 0.1
+
+# The number of graphs alive while the calls of another graph are measured, and the maximal ratio of these calls
+# to the calls with no other graph alive
+GRAPHS_ALIVE = 20_000
+GRAPHS_RATIO = 1.5
+
+# The calls measured for a disabled graph, each compared with the call of an empty function in the same form
+_DISABLED_CALLS = {"add_node": ("graph.add_node('Step', text='Some text', cluster='Cluster')",
+                                "empty('Step', text='Some text', cluster='Cluster')"),
+                   "step": ("with graph.step('Step'):\n    pass", "empty('Step')\nwith context:\n    pass"),
+                   "timed": ("decorated(1)", "empty(1)"),
+                   "globals": ("Graph.globals['bench'].add_node('Step')", "functions['empty']('Step')")}
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import easygraph
+seconds = time.perf_counter() - start
+print(seconds, *[m for m in {modules!r} if m in sys.modules])
+"""
+
+
+def _timed(function, *args) -> float:
+    """
+    :return: The seconds function(*args) took
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _peak_memory(workload, n:int) -> int:
+    """
+    For measuring the peak of allocated memory while adding the nodes and creating the Digraph object. Runs
+    separately, since tracing the memory slows everything down.
+
+    :return: The peak in bytes
+    """
+    Graph.label_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        graph = Graph(measure_time=True, enabled=True)
+        workload(graph, n)
+        graph.create()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_one(name:str, n:int, render_max:int=10_000, memory:bool=True) -> dict:
+    """
+    For running one workload with n nodes.
+
+    :param name: The name of the workload, see WORKLOADS
+    :param n: The number of nodes
+    :param render_max: Graphs with more nodes are not rendered, since the layout takes very long
+    :param memory: If True, the peak memory is measured in an extra run
+    :return: dict with 'workload', 'nodes', 'edges', 'clusters', 'seconds' of each phase (None if skipped),
+             'nodes_per_second' of adding the nodes and 'peak_bytes'
+    """
+    workload = WORKLOADS[name]
+    seconds = {}
+
+    # 1) Formatting the distinct labels, without the label cache
+    if name == "text":
+        colours = list(TITLE_COLOURS)
+        seconds["format"] = _timed(lambda: [format_label(t, title_colour=colours[k % len(colours)])
+                                            for k, t in enumerate(texts()[:n])])
+    else:
+        seconds["format"] = None
+
+    # 2) Adding the nodes (including formatting, starting with an empty label cache), create() and the DOT source
+    Graph.label_cache.clear()
+    gc.collect()
+    graph = Graph(measure_time=True, enabled=True)
+    seconds["add"] = _timed(workload, graph, n)
+    seconds["create"] = _timed(graph.create)
+    seconds["dot_source"] = _timed(lambda: graph.dot.source)
+    seconds["write_dot"] = _timed(graph.write_dot, io.StringIO())
+
+    # 3) Rendering, if graphviz is installed and the graph is small enough
+    seconds["render"] = None
+    if n <= render_max and shutil.which("dot") is not None:
+        with tempfile.TemporaryDirectory() as directory:
+            seconds["render"] = _timed(graph.save, os.path.join(directory, "bench"), "svg", "stream")
+
+    return {"workload": name,
+            "nodes": len(graph.nodes),
+            "edges": len(graph._nodes.edge_src),
+            "clusters": len(graph.clusters),
+            "seconds": seconds,
+            "nodes_per_second": n / seconds["add"] if seconds["add"] > 0 else None,
+            "peak_bytes": _peak_memory(workload, n) if memory else None}
+
+
+def import_time(budget:float=IMPORT_BUDGET, repeat:int=5) -> dict:
+    """
+    For measuring 'import easygraph' in fresh interpreters. The fastest of the runs counts, thus the first
+    run may write the bytecode cache.
+
+    :param budget: The maximal seconds
+    :param repeat: The number of interpreters started
+    :return: dict with 'seconds', 'budget', 'modules' (the heavy modules which were loaded) and 'ok'
+    """
+    package = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [package, os.environ.get("PYTHONPATH")]))}
+    best, modules = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(modules=HEAVY_MODULES)],
+                                env=env, capture_output=True, text=True, check=True).stdout.split()
+        if best is None or float(output[0]) < best:
+            best = float(output[0])
+        modules = output[1:]
+    return {"seconds": best, "budget": budget, "modules": modules, "ok": best <= budget and not modules}
+
+
+def _empty(*args, **kwargs):
+    pass
+
+
+class _EmptyContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def disabled_overhead(budget:float=DISABLED_BUDGET, calls:int=200_000, repeat:int=5) -> dict:
+    """
+    For measuring the calls of a disabled graph (Graph(enabled=False)), which must stay within a small constant
+    of the call of an empty function, thus the recording can stay in production code. The fastest of the runs
+    counts.
+
+    :param budget: The maximal nanoseconds a call may take longer
+    :param calls: The number of calls per run
+    :param repeat: The number of runs
+    :return: dict with 'nanoseconds' (of each call: [disabled, empty]), 'budget' and 'ok'
+    """
+    enabled = Graph.enabled
+    Graph.enabled = False
+    try:
+        graph = Graph()
+        graph.add_global("bench")
+        namespace = {"graph": graph, "Graph": Graph, "empty": _empty, "context": _EmptyContext(),
+                     "functions": {"empty": _empty}, "decorated": graph.timed("Step")(_empty)}
+        nanoseconds = {}
+        for name, statements in _DISABLED_CALLS.items():
+            nanoseconds[name] = [min(timeit.repeat(statement, globals=namespace, number=calls, repeat=repeat))
+                                 / calls * 1e9 for statement in statements]
+    finally:
+        Graph.enabled = enabled
+        Graph.globals.pop("bench", None)
+    return {"nanoseconds": nanoseconds, "budget": budget,
+            "ok": all(disabled - empty <= budget for disabled, empty in nanoseconds.values())}
+
+
+def run(workloads=tuple(WORKLOADS), sizes=SIZES, render_max:int=10_000, memory:bool=True, log=print) -> dict:
+    """
+    For running all combinations of workloads and sizes.
+
+    :param log: Function called with a line per finished run, None for silence
+    :return: dict with 'python', 'platform', 'created' and 'results' (see run_one())
+    """
+    results = []
+    for name in workloads:
+        for n in sizes:
+            result = run_one(name, n, render_max=render_max, memory=memory)
+            results.append(result)
+            if log is not None:
+                log(format_result(result))
+    return {"python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "results": results}
+
+
+def format_import(result:dict) -> str:
+    """
+    :return: One line describing the result of import_time()
+    """
+    line = (f"import easygraph: {result['seconds'] * 1e3:.1f} ms (budget {result['budget'] * 1e3:.0f} ms)"
+            f"{'' if result['ok'] else '  EXCEEDED'}")
+    if result["modules"]:
+        line += f"  loaded: {', '.join(result['modules'])}"
+    return line
+
+
+def step_overhead(budget:float=STEP_BUDGET, calls:int=1_000, repeat:int=100) -> dict:
+    """
+    For measuring the overhead of recording a block with Graph.step(), compared with an empty 'with' block. The
+    steps are stored after each run, which has fewer steps than easygraph.timing.MAX_PENDING, thus only the
+    recording itself is measured. The fastest of the runs counts.
+
+    Also reported, but not part of the budget: 'stored', the steps of an aggregating graph including storing them
+    into the statistics, which happens inline once MAX_PENDING steps are queued.
+
+    :param budget: The maximal nanoseconds a step may take longer
+    :param calls: The number of steps per run
+    :param repeat: The number of runs
+    :return: dict with 'nanoseconds' (per step: {'plain', 'measure_time', 'stored'}: [step, empty]), 'budget' and
+             'ok'
+    """
+    context = _EmptyContext()
+    nanoseconds = {}
+    for name, measure_time, number in (("plain", False, calls), ("measure_time", True, calls),
+                                       ("stored", False, 10 * MAX_PENDING)):
+        graph = Graph(measure_time=measure_time, aggregate=True, enabled=True)
+        namespace = {"graph": graph, "context": context}
+        times = []
+        for statement in ("with graph.step('Step'):\n    pass", "with context:\n    pass"):
+            best = None
+            for _ in range(repeat if number == calls else 3):
+                seconds = timeit.timeit(statement, globals=namespace, number=number)
+                graph._flush_steps()
+                best = seconds if best is None else min(best, seconds)
+            times.append(best / number * 1e9)
+        nanoseconds[name] = times
+    return {"nanoseconds": nanoseconds, "budget": budget,
+            "ok": all(step - empty <= budget for name, (step, empty) in nanoseconds.items() if name != "stored")}
+
+
+def graphs_overhead(graphs:int=GRAPHS_ALIVE, ratio:float=GRAPHS_RATIO, calls:int=1_000, repeat:int=50) -> dict:
+    """
+    For checking that the calls of a graph do not depend on the number of other graphs, e.g. with a graph per
+    request. The calls of add_node() and step() of an aggregating graph are measured without other graphs and
+    again while 'graphs' graphs with one node each are alive. The fastest of the runs counts. The runs have fewer
+    steps than easygraph.timing.MAX_PENDING, thus the steps are stored after each run, as for step_overhead().
+
+    :param graphs: The number of other graphs
+    :param ratio: The maximal ratio of the calls with the other graphs to the calls without
+    :param calls: The number of calls per run
+    :param repeat: The number of runs
+    :return: dict with 'nanoseconds' (per call: [without, with other graphs]), 'graphs', 'ratio' and 'ok'
+    """
+    statements = {"add_node": "graph.add_node('Step')", "step": "with graph.step('Step'):\n    pass"}
+
+    def measure():
+        graph = Graph(aggregate=True, enabled=True)
+        namespace = {"graph": graph}
+        result = {}
+        for name, statement in statements.items():
+            best = None
+            for _ in range(repeat):
+                seconds = timeit.timeit(statement, globals=namespace, number=calls)
+                graph._flush_steps()
+                best = seconds if best is None else min(best, seconds)
+            result[name] = best / calls * 1e9
+        return result
+
+    without = measure()
+    alive = []
+    for k in range(graphs):
+        alive.append(Graph(enabled=True))
+        alive[-1].add_node(f"Step {k}")
+    with_graphs = measure()
+    del alive
+    nanoseconds = {name: [without[name], with_graphs[name]] for name in statements}
+    return {"nanoseconds": nanoseconds, "graphs": graphs, "ratio": ratio,
+            "ok": all(other <= alone * ratio for alone, other in nanoseconds.values())}
+
+
+def sampling_accuracy(tolerance:float=SAMPLING_TOLERANCE, calls:int=20_000, n:int=10) -> dict:
+    """
+    For checking that the estimated total time of a sampled loop (Graph(sampling=EveryNth(n)), measure_time and
+    aggregate) matches the time the loop took.
+
+    :param tolerance: The maximal relative error of the estimated total
+    :param calls: The number of calls of add_node() in the loop
+    :param n: Every n-th call is sampled
+    :return: dict with 'seconds' (of the loop), 'total' (the estimated total), 'tolerance' and 'ok'
+    """
+    from ..sampling import EveryNth
+    graph = Graph(measure_time=True, aggregate=True, sampling=EveryNth(n), enabled=True)
+    graph.add_node("Start")
+    start = time.perf_counter()
+    for _ in range(calls):
+        sum(range(100))
+        graph.add_node("Step")
+    seconds = time.perf_counter() - start
+    total = graph.nodes["Step"]["stats"]["total"]
+    return {"seconds": seconds, "total": total, "tolerance": tolerance,
+            "ok": abs(total - seconds) <= tolerance * seconds}
+
+
+def format_sampling(result:dict) -> str:
+    """
+    :return: One line describing the result of sampling_accuracy()
+    """
+    return (f"sampling: loop={result['seconds'] * 1e3:.1f}ms  estimated Σ≈{result['total'] * 1e3:.1f}ms  "
+            f"(budget ±{result['tolerance']:.0%}){'' if result['ok'] else '  EXCEEDED'}")
+
+
+def format_graphs(result:dict) -> str:
+    """
+    :return: One line describing the result of graphs_overhead()
+    """
+    calls = "  ".join(f"{name}={alone:.0f}ns/{other:.0f}ns" for name, (alone, other) in result["nanoseconds"].items())
+    return (f"graphs: {calls}  (alone/with {result['graphs']} other graphs, budget x{result['ratio']:g})"
+            f"{'' if result['ok'] else '  EXCEEDED'}")
+
+
+def format_step(result:dict) -> str:
+    """
+    :return: One line describing the result of step_overhead()
+    """
+    steps = "  ".join(f"{name}={step:.0f}ns ({step - empty:+.0f})" for name, (step, empty) in result["nanoseconds"].items())
+    return (f"step: {steps}  (budget +{result['budget']:.0f} ns over an empty 'with')"
+            f"{'' if result['ok'] else '  EXCEEDED'}")
+
+
+def format_disabled(result:dict) -> str:
+    """
+    :return: One line describing the result of disabled_overhead()
+    """
+    calls = "  ".join(f"{name}={disabled:.0f}ns ({disabled - empty:+.0f})"
+                      for name, (disabled, empty) in result["nanoseconds"].items())
+    return (f"disabled: {calls}  (budget +{result['budget']:.0f} ns over an empty call)"
+            f"{'' if result['ok'] else '  EXCEEDED'}")
+
+
+def format_result(result:dict) -> str:
+    """
+    :return: One line describing the result of run_one()
+    """
+    phases = "  ".join(f"{phase}={value:.3f}s" for phase, value in result["seconds"].items() if value is not None)
+    peak = f"  peak={result['peak_bytes'] / 2**20:.1f}MiB" if result["peak_bytes"] is not None else ""
+    return (f"{result['workload']:>8} {result['nodes']:>9} nodes  {result['nodes_per_second']:>10.0f} nodes/s  "
+            f"{phases}{peak}")
+
+
+def compare(old:dict, new:dict) -> list[str]:
+    """
+    For comparing two results of run(), e.g. of two versions of easygraph.
+
+    :return: One line per workload and size in both results with the ratio new/old of each phase
+             (below 1 means faster)
+    """
+    old_results = {(r["workload"], r["nodes"]): r for r in old["results"]}
+    lines = []
+    for r in new["results"]:
+        o = old_results.get((r["workload"], r["nodes"]))
+        if o is None:
+            continue
+        ratios = "  ".join(f"{phase}={value / o['seconds'][phase]:.2f}x"
+                           for phase, value in r["seconds"].items()
+                           if value is not None and o["seconds"].get(phase))
+        lines.append(f"{r['workload']:>8} {r['nodes']:>9} nodes  {ratios}")
+    return lines
@@ -0,0 +1,87 @@
+"""
+The synthetic workloads of the benchmarks. Each workload adds n nodes to a Graph with add_node(), thus through
+the same path as instrumented code.
+"""
+import itertools
+
+from ..formatting import TITLE_COLOURS
+
+
+# Number of nodes joined by one node of the fan-in workload
+FAN_IN = 32
+
+# Number of nodes per block of 10 nested clusters in the nested workload
+NESTED_BLOCK = 100
+
+# Number of distinct texts of the text workload. Repeated texts are taken from the label cache.
+DISTINCT_TEXTS = 1000
+
+_TEXT = """Step: Create own AI {k} ######################################################
+
+Description: To create my own AI with a super cool framework, iteration {k}.
+
+    [X] Collect data
+    [X] Prepare data
+    [ ] Code AI (1)
+    [ ] Train / Test AI
+
+Note: Keep AI {k} secret.
+"""
+
+
+def chain(graph, n:int):
+    """
+    A flat chain: each node is connected to the previous one ('auto').
+    """
+    for i in range(n):
+        graph.add_node(f"n{i}")
+
+
+def fan_in(graph, n:int):
+    """
+    Groups of FAN_IN independent nodes, each group joined by one node with a 'connect_from' list.
+    """
+    group = []
+    for i in range(n):
+        if len(group) == FAN_IN:
+            graph.add_node(f"n{i}", connect_from=group)
+            group = []
+        else:
+            graph.add_node(f"n{i}", connect_from=None)
+            group.append(f"n{i}")
+
+
+def nested(graph, n:int):
+    """
+    Blocks of 10 nested clusters as in examples/example_3_nesting.py, the nodes spread over the levels.
+    """
+    for i in range(n):
+        block, k = divmod(i, NESTED_BLOCK)
+        if k == 0:
+            for level in range(1, 11):
+                graph.add_cluster(f"Cluster {block}.{level}", text=f"Level {level}",
+                                  supercluster=f"Cluster {block}.{level - 1}" if level > 1 else None)
+        graph.add_node(f"n{i}", cluster=f"Cluster {block}.{k % 10 + 1}")
+
+
+def texts() -> list[str]:
+    """
+    :return: The distinct texts of the text workload
+    """
+    return [_TEXT.format(k=k) for k in range(DISTINCT_TEXTS)]
+
+
+def text(graph, n:int):
+    """
+    Text-heavy labels as in examples/example_1_big.py, with DISTINCT_TEXTS different texts and all title colours.
+    """
+    distinct = texts()
+    colours = itertools.cycle(TITLE_COLOURS)
+    for i in range(n):
+        graph.add_node(f"n{i}", text=distinct[i % DISTINCT_TEXTS], title_colour=next(colours))
+
+
+WORKLOADS = {"chain": chain,
+             "fan_in": fan_in,
+             "nested": nested,
+             "text": text}
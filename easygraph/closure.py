@@ -0,0 +1,129 @@
+"""
+For queries of the structure of a graph: the ancestors and descendants of the nodes (see Graph.ancestors() and
+Graph.descendants()) and a topological order. The ancestors and descendants are computed on demand and cached per
+node. Edges are only ever added, thus the cache checks the edges added since it was used last and drops only the
+cached sets which they change.
+"""
+import collections
+
+
+class ClosureCache:
+    """
+    The ancestors and descendants (ids) of the nodes of a NodeStore, cached per node. A node in a cycle is not its own
+    ancestor or descendant.
+    """
+
+    def __init__(self, nodes):
+        """
+        * nodes: the NodeStore, which may still grow
+
+        """
+        self._nodes = nodes
+        self._ancestors: dict[int, frozenset[int]] = {}
+        self._descendants: dict[int, frozenset[int]] = {}
+
+        # The number of edges the cached sets are valid for
+        self._edges = 0
+
+
+    def ancestors(self, i:int) -> frozenset[int]:
+        """
+        :return: The ids of all nodes with a path to node i
+        """
+        self._update()
+        return self._closure(i, self._ancestors, self._nodes.predecessors)
+
+
+    def descendants(self, i:int) -> frozenset[int]:
+        """
+        :return: The ids of all nodes with a path from node i
+        """
+        self._update()
+        return self._closure(i, self._descendants, self._nodes.successors)
+
+
+    def clear(self):
+        self._ancestors.clear()
+        self._descendants.clear()
+
+
+    def _update(self):
+        """
+        For dropping the cached sets changed by the edges added since the last query. A new edge u -> v adds
+        ancestors to v and to each node with v as ancestor, and descendants to u and to each node with u as
+        descendant. Thus, only the cached sets are checked, the graph is not traversed.
+
+        :return: Nothing
+        """
+        nodes = self._nodes
+        e0, e1 = self._edges, len(nodes.edge_src)
+        if e0 == e1:
+            return
+        self._edges = e1
+        for cache, ends in ((self._ancestors, nodes.edge_dst), (self._descendants, nodes.edge_src)):
+            if not cache:
+                continue
+            starts = set(ends[e0:e1])
+            for i in [i for i, closure in cache.items() if i in starts or not closure.isdisjoint(starts)]:
+                del cache[i]
+
+
+    @staticmethod
+    def _closure(i:int, cache:dict, neighbours) -> frozenset[int]:
+        """
+        For the nodes reachable from node i via neighbours (predecessors or successors), by a depth-first search.
+        The search does not go beyond nodes whose set is cached already, but takes their set.
+
+        :return: The ids of the reachable nodes, without i
+        """
+        result = cache.get(i)
+        if result is not None:
+            return result
+
+        found = set()
+        stack = [i]
+        while stack:
+            for j in neighbours(stack.pop()):
+                if j in found:
+                    continue
+                found.add(j)
+                cached = cache.get(j)
+                if cached is None:
+                    stack.append(j)
+                else:
+                    found |= cached
+        found.discard(i)
+        result = cache[i] = frozenset(found)
+        return result
+
+
+def topological_order(nodes) -> list[int]|None:
+    """
+    For ordering the nodes such that each node comes after all its predecessors. O(V+E).
+
+    * If all edges go from a node to a node added later (usual for recorded graphs), the order the nodes
+      were added is returned.
+    * Otherwise, e.g. with repeated nodes (Graph(aggregate=True)) or add_nodes() connecting from later nodes of
+      the batch, Kahn's algorithm is used.
+
+    :param nodes: The NodeStore
+    :return: The ids of the nodes, None if the graph has a cycle
+    """
+    n = len(nodes)
+    if all(src < dst for src, dst in zip(nodes.edge_src, nodes.edge_dst)):
+        return list(range(n))
+
+    in_degree = [0] * n
+    for dst in nodes.edge_dst:
+        in_degree[dst] += 1
+
+    ready = collections.deque(i for i in range(n) if in_degree[i] == 0)
+    order = []
+    while ready:
+        i = ready.popleft()
+        order.append(i)
+        for j in nodes.successors(i):
+            in_degree[j] -= 1
+            if in_degree[j] == 0:
+                ready.append(j)
+    return order if len(order) == n else None
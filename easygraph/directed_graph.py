@@ -1,9 +1,90 @@
-import sys
-
-from graphviz import Digraph
-import textwrap
+import collections
+import io
+import os
+import threading
 import time
-import re
+
+# Only the modules needed for recording are imported here. graphviz, the DOT writer, rendering, tracing of the
+# memory, journal, persistence and the call recorder are imported when they are used first, thus importing
+# easygraph stays fast, e.g. for short-lived tools and forked workers.
+from .formatting import format_label
+from .label_cache import LabelCache
+from .stats import RunningStats
+from .timing import Chain, Step, timed
+from .storage import (ClusterStore, NodeStore, ClustersView, NodesView, NAN, NO_MEMORY, CONNECT_NONE, CONNECT_SINGLE,
+                      CONNECT_LIST)
+from .null_graph import NULL_GRAPH, _NULL_CONTEXT
+from .closure import ClosureCache, topological_order
+
+# Only for the annotations. Not typing.TYPE_CHECKING, since importing typing also imports re. Type checkers
+# treat this name as True.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import graphviz
+    from .profiler import CallRecorder
+    from .render_cache import RenderCache
+
+
+# The keys (and order for tuples) of add_clusters() and add_nodes() with their default values
+_CLUSTER_FIELDS = (("name", None), ("text", ""), ("supercluster", None))
+_NODE_FIELDS = (("name", None), ("connect_from", "auto"), ("text", None), ("cluster", None), ("title_colour", "yellow"),
+                ("width", 1), ("time_absolute", None), ("time_relative", None))
+
+
+def _rows(specs, fields) -> list[tuple]:
+    """
+    For converting the specifications of add_clusters() or add_nodes() into tuples with all fields.
+    Missing fields and None are replaced by the default value, except for 'connect_from' where None means
+    no connection. For columnar data also NaN (missing value of pandas/NumPy) is replaced.
+
+    :param specs: Iterable of dicts or tuples, or a mapping from keys to columns
+    :param fields: The keys with their default values
+    :return: list of tuples
+    """
+    # Fields where None is replaced by a default value different from None
+    replace = [(i, default) for i, (key, default) in enumerate(fields) if default is not None and key != "connect_from"]
+
+    # Columnar data, e.g. dict of lists, pandas DataFrame or NumPy structured array
+    keys = getattr(getattr(specs, "dtype", None), "names", None) or (specs.keys() if hasattr(specs, "keys") else None)
+    if keys is not None:
+        columns = []
+        for key, default in fields:
+            if key not in keys:
+                columns.append(None)
+            elif key == "connect_from":
+                columns.append([default if v != v else v for v in specs[key]])
+            else:
+                columns.append([default if v is None or v != v else v for v in specs[key]])
+        if all(c is None for c in columns):
+            print(f"Error: None of the columns {sorted(keys)} is known! Use {[key for key, _ in fields]}.")
+            return []
+        length = len(next(c for c in columns if c is not None))
+        columns = [[default] * length if c is None else c for c, (_, default) in zip(columns, fields)]
+        return list(zip(*columns))
+
+    rows = []
+    for spec in specs:
+        if isinstance(spec, dict):
+            row = [spec.get(key, default) for key, default in fields]
+        else:
+            row = list(spec) + [default for _, default in fields[len(spec):]]
+        for i, default in replace:
+            if row[i] is None:
+                row[i] = default
+        rows.append(tuple(row))
+    return rows
+
+
+class _Globals(dict):
+    """
+    The dict of Graph.globals. While disabled, unknown keys give the NullGraph, thus modules looking up a graph
+    which was never added keep working.
+    """
+
+    def __missing__(self, name:str):
+        if not Graph.enabled:
+            return NULL_GRAPH
+        raise KeyError(name)
 
 
 class Graph:
@@ -13,133 +94,220 @@ class Graph:
 
     # To be able to store and access global an instance of this class.
     # Thus, possible to access and extend one Graph from each modul.
-    globals: dict = {}
+    globals: dict = _Globals()
+
+    # Global switch: if False, Graph() returns the NullGraph (see null_graph.py) whose methods do nothing, thus
+    # the recording can stay in production code. Set by the environment variable EASYGRAPH_DISABLED=1.
+    enabled: bool = os.environ.get("EASYGRAPH_DISABLED", "") in ("", "0")
 
-    def __init__(self, measure_time:bool=False, levels:int=10):
+    # The finished HTML labels are shared between all Graph objects. Thus, the same step text is only
+    # formatted once. Use e.g. Graph.label_cache.resize(...) or Graph.label_cache.clear() to adjust it.
+    label_cache: LabelCache = LabelCache()
+
+    def __new__(cls, *args, enabled:bool|None=None, **kwargs):
+        if not (Graph.enabled if enabled is None else enabled):
+            return NULL_GRAPH
+        return super().__new__(cls)
+
+
+    def __init__(self, measure_time:bool=False, levels:int=10, aggregate:bool=False, measure_memory:bool=False,
+                 memory_top:int=0, colour_by_memory:bool=False, journal=None, sampling=None,
+                 enabled:bool|None=None):
         """
+        * If enabled=False (default: Graph.enabled, False with the environment variable EASYGRAPH_DISABLED=1),
+          the NullGraph is returned instead. All its methods do nothing, decorators of timed() return the
+          function unchanged and step() a shared context manager. Thus, the overhead is about a function call.
         * If measure_time=True, also the time passed will be measured for each node.
+        * If measure_memory=True, the memory allocated since the previous node (with steps: inside the step) and
+          the peak above it are measured with tracemalloc and shown at the edges into the node. With memory_top > 0
+          also this number of top allocation sites is kept per node (g.nodes[name]["memory"]["top"]), which is
+          slow. With colour_by_memory=True, nodes with a peak of 1 MiB or more are coloured by it.
+        * If aggregate=True, adding a node with the name of an existing node (e.g. in a loop) updates running
+          statistics of the node (count, total, min, max, mean, p50, p95 of the measured times) instead of
+          being refused. The statistics are shown in the node and at the edges into it.
         * The levels are defining the maximal depth of nesting for clusters. This defines
           the darkening of the deeper clusters.
+        * With journal (a path or a Journal), each added cluster, node and edge is appended to a journal file
+          by a background thread, thus a crashed job can be rebuilt with Graph.replay(path). The journal must
+          not exist yet. Close it with g.journal.close() (done at exit automatically).
+        * With sampling (a policy of sampling.py, e.g. EveryNth(100)), only some calls of add_node(), step() and
+          timed() functions are recorded, the others are only counted. Use it with aggregate=True for steps
+          executed very often, e.g. per request, thus all sampled calls of a step are recorded as one node. Its
+          label shows the sampled calls, and the count, total and mean time are estimated for all calls by the
+          weight the policy gives each sampled call. Without aggregate, each node stands for one sampled call and
+          is not scaled.
 
         """
-        self.clusters = {}
-        self.nodes = {}
-        self.dot = Digraph()
-        self.node_previous_auto: str = None
-
+        # The clusters and nodes are stored compactly in columns. self.clusters and self.nodes are
+        # read-only views, e.g. self.nodes[name]["cluster"].
+        self._clusters = ClusterStore()
+        self._nodes = NodeStore()
+        self.clusters = ClustersView(self._clusters)
+        self._stats: dict[int, RunningStats] = {}
+        self._memory_top: dict[int, list[dict]] = {}
+        self.nodes = NodesView(self._nodes, self._clusters, flush=self._flush_steps, stats=self._stats,
+                               memory_top=self._memory_top)
+        self._dot = None
+
+        # The ancestors and descendants of queried nodes (see ancestors(), descendants())
+        self._closure = ClosureCache(self._nodes)
+
+        # The stores are only changed while holding the lock, thus nodes can be added from several threads.
+        # The previous node for 'auto' chaining and the time of it are tracked per thread and per asyncio
+        # task. Thus, each of them gets its own chain of nodes.
+        self._lock = threading.RLock()
+        self._chain = Chain()
+
+        # Nodes (ids) and clusters added since the last call of create(), thus not yet in self.dot
+        self._new_nodes: list[int] = []
+        self._new_clusters: list[str] = []
+
+        # Index of the cluster hierarchy: the subclusters of each cluster (None for the top level) in the
+        # order they were added, and the depth of each cluster (0 for the top level). A cluster can be
+        # added before its supercluster, then its depth is set as soon as the supercluster is added.
+        self._cluster_children: dict[str|None, list[str]] = {None: []}
+        self._cluster_depth: dict[str, int] = {}
+
+        # Steps timed by step() or timed() which are not yet stored (see _flush_steps())
+        self._pending_steps = collections.deque()
+
+        # The times are taken with time.perf_counter_ns() relative to _time_start_ns, which is the same point in
+        # time as time_start (time.time()). Also the time of the previous node in the chain is in nanoseconds.
         self.measure_time = measure_time
         if measure_time:
             self.time_start = time.time()
-        self.time_node_previous = None
+        self._time_start_ns = time.perf_counter_ns()
+
+        # Statistics of repeated nodes (id -> RunningStats). Since they change nodes which are already in
+        # self.dot, create() builds the Digraph object again if they changed.
+        self.aggregate = aggregate
+        self._stats_changed = False
+
+        # The sampling policy, None for recording all calls
+        self.sampling = sampling
+
+        # True if self.dot shows collapsed clusters (create(max_cluster_nodes=...)), thus the next create()
+        # without collapsing builds it again
+        self._collapsed = False
+
+        # Tracing of the memory is started with the first graph which measures it, if not running already
+        self.measure_memory = measure_memory
+        self.colour_by_memory = colour_by_memory
+        self._memory = None
+        if measure_memory:
+            from .memory import MemoryTracker
+            self._memory = MemoryTracker(top=memory_top)
 
         if levels < 2:
             print(f"Error: Maximum level depth need to me minimum 2! But you have chosen {levels}")
         else:
             self.levels = levels
 
+        # The journal is started last, since its header contains the options of this graph
+        self.journal = None
+        if journal is not None:
+            from .journal import Journal
+            self.journal = journal if isinstance(journal, Journal) else Journal(journal)
+            self.journal.start({"measure_time": measure_time,
+                                "time_start": getattr(self, "time_start", None),
+                                "levels": levels,
+                                "aggregate": aggregate,
+                                "measure_memory": measure_memory,
+                                "colour_by_memory": colour_by_memory})
+
+
+    @property
+    def dot(self) -> "graphviz.Digraph":
+        """
+        The graphviz Digraph object built by create(). graphviz is imported when it is used first.
+        """
+        if self._dot is None:
+            from graphviz import Digraph
+            self._dot = Digraph()
+        return self._dot
+
+    @dot.setter
+    def dot(self, dot:"graphviz.Digraph"):
+        self._dot = dot
+
 
-    def _format_delta(self, delta_seconds: float) -> str:
-        """
-        Format a time interval in seconds into the most appropriate unit:
-        ns, μs, ms, s, min, or h.
-        """
-        # nanoseconds
-        if delta_seconds < 1e-6:
-            value = delta_seconds * 1e9
-            unit = "ns"
-        # microseconds
-        elif delta_seconds < 1e-3:
-            value = delta_seconds * 1e6
-            unit = "μs"
-        # milliseconds
-        elif delta_seconds < 1.0:
-            value = delta_seconds * 1e3
-            unit = "ms"
-        # seconds
-        elif delta_seconds < 60.0:
-            value = delta_seconds
-            unit = "s"
-        # minutes
-        elif delta_seconds < 3600.0:
-            value = delta_seconds / 60.0
-            unit = "min"
-        # hours (and beyond)
+    @property
+    def node_previous_auto(self) -> str|None:
+        """
+        The previous created node of the current thread or asyncio task, used for 'auto' chaining.
+        """
+        return self._get_previous()[0]
+
+    @node_previous_auto.setter
+    def node_previous_auto(self, name:str|None):
+        self._set_previous((name, self._get_previous()[1]))
+
+
+    @property
+    def time_node_previous(self) -> float|None:
+        """
+        The time (as time.time()) the previous node of the current thread or asyncio task was created, None if the
+        time is not measured.
+        """
+        t = self._get_previous()[1]
+        if t is None or not self.measure_time:
+            return None
+        return self.time_start + (t - self._time_start_ns) / 1e9
+
+    @time_node_previous.setter
+    def time_node_previous(self, t:float|None):
+        if t is not None and self.measure_time:
+            t = self._time_start_ns + round((t - self.time_start) * 1e9)
         else:
-            value = delta_seconds / 3600.0
-            unit = "h"
-
-        # Format with up to three significant digits
-        fmt = f"{value:.3g} {unit}"
-        return fmt
-
-
-    def _collapse_inside_markers(self, text: str, marker: str = '´') -> str:
-        """
-        For being able to write comment-like strings and also break the line for a nicer
-        string formation in the code file. Also, then intends can be added and will be removed.
-        This prepares the comment-string for the node text with no intends and line breaks
-        inside ` ` and also removes the ` `.
-
-        For each pair of marker characters in `text`:
-            * Capture everything between them (incl. real newlines)
-            * Strip spaces on each line and drop blanks
-            * Collapse into a single line
-            * Remove both markers
-
-        :param text: The input string
-        :return: String where extra whitespaces and linebreaks inside ´ ´ parts is removed.
-        """
-        esc = re.escape(marker)
-        # \s* around the capture lets us trim stray spaces immediately inside the markers
-        pattern = re.compile(f'{esc}\\s*([\\s\\S]*?)\\s*{esc}')
-
-        def _repl(m):
-            block = m.group(1)
-            lines = block.splitlines()
-            # strip each line and drop empty ones
-            pieces = [ln.strip() for ln in lines if ln.strip()]
-            return " ".join(pieces)
-
-        return pattern.sub(_repl, text)
-
-
-    def _replace_with_circles(self, text: str) -> str:
-        """
-        This method recognises patterns like ' (letter or number) ' and replaces
-        it with a corresponding symbol. Preparation for node text.
-
-        Thus, replaces occurrences of "(...)" in the given text with:
-            * ①–⑳ for (1)–(20)
-            * Ⓐ–Ⓩ for (A)–(Z)
-            * ⓐ–ⓩ for (a)–(z)
-        For (XX) → only the last character 'X' is used → ⒳
-        For numbers greater than 20 (e.g. (21)) → remains '(21)' unchanged.
-
-        :param text: The input string
-        :return: String with circles added
-        """
-        # Prepare mappings for circled characters
-        circled_numbers = {str(i): chr(0x2460 + i - 1) for i in range(1, 21)}
-        circled_upper = {chr(ord('A') + i): chr(0x24B6 + i) for i in range(26)}
-        circled_lower = {chr(ord('a') + i): chr(0x24D0 + i) for i in range(26)}
-
-        def _repl(m: re.Match) -> str:
-            inner = m.group('inner')
-            # Only digits?
-            if inner.isdigit():
-                return circled_numbers.get(inner, m.group(0))
-            # Only a single letter
-            if inner.isalpha() and len(inner) == 1:
-                ch = inner  # exactly one char now
-                if ch.isupper():
-                    return circled_upper.get(ch, m.group(0))
-                else:
-                    return circled_lower.get(ch, m.group(0))
-            # Everything else (including "XX", "a1", etc.): leave unchanged
-            return m.group(0)
+            t = None
+        self._set_previous((self._get_previous()[0], t))
+
+
+    def _set_time_start(self, time_start:float):
+        """
+        For setting the start time (as time.time()) of a loaded or unpickled graph. The start of the nanosecond
+        clock (time.perf_counter_ns(), which differs per process) is moved to the same point in time.
+
+        :return: Nothing
+        """
+        self.time_start = time_start
+        self._time_start_ns = time.perf_counter_ns() - round((time.time() - time_start) * 1e9)
+
+
+    def _get_previous(self) -> tuple:
+        """
+        :return: The previous node for 'auto' chaining and its time (name, time) in the current thread or task,
+                 the time in nanoseconds of time.perf_counter_ns()
+        """
+        return self._chain.get()
+
+
+    def _set_previous(self, previous:tuple):
+        """
+        :param previous: The tuple (name, time) of the previous node in the current thread or task
+        :return: Nothing
+        """
+        self._chain.set(previous)
+
+
+    def _format_label(self, text:str, title_colour:str, width:float) -> str:
+        """
+        For turning the text of a node into the final HTML label. Already formatted labels are taken
+        from the label cache.
 
-        # Substitute and return the modified text
-        return re.sub(r'\((?P<inner>[^)]+)\)', _repl, text)
+        :param text: The raw text of the node
+        :param title_colour: The background colour of the step title
+        :param width: The relative width of the node
+        :return: HTML formatted string
+        """
+        key = (text, title_colour, width)
+        label = self.label_cache.get(key)
+        if label is not None:
+            return label
+
+        label = format_label(text, title_colour=title_colour, text_width=50*width)
+        self.label_cache.put(key, label)
+        return label
 
 
     def add_global(self, name:str):
@@ -162,10 +330,35 @@ class Graph:
         :return: Nothing
         """
 
-        if name in self.clusters:
-            print(f"(!) Cluster already exists: {name}")
-        else:
-            self.clusters[name] = {"text": text, "supercluster": supercluster}
+        with self._lock:
+            clusters = self._clusters
+            if name in clusters.ids:
+                print(f"(!) Cluster already exists: {name}")
+                return
+
+            # Walk up from the supercluster. Reaching this cluster again means the nesting would be a cycle.
+            sup = supercluster
+            while sup is not None:
+                if sup == name:
+                    print(f"Error: Cluster '{name}' can not be nested in '{supercluster}', since this would be a cycle!")
+                    return
+                sup = clusters.supercluster[clusters.ids[sup]] if sup in clusters.ids else None
+
+            clusters.add(name, text, supercluster)
+            if self.journal is not None:
+                self.journal.append(("c", name, text, supercluster))
+            self._new_clusters.append(name)
+            self._cluster_children.setdefault(supercluster, []).append(name)
+
+            # Set the depth of this cluster and of all subclusters which were waiting for it
+            if supercluster is None or supercluster in self._cluster_depth:
+                self._cluster_depth[name] = 0 if supercluster is None else self._cluster_depth[supercluster] + 1
+                stack = [name]
+                while stack:
+                    c = stack.pop()
+                    for sub in self._cluster_children.get(c, ()):
+                        self._cluster_depth[sub] = self._cluster_depth[c] + 1
+                        stack.append(sub)
 
 
     def add_node(self,
@@ -200,354 +393,1090 @@ class Graph:
         :param title_colour: Possible 'green' for a completed node, 'yellow' for a node in progress, and 'red' for a faulty node.
         :return:
         """
+        sampling = self.sampling
+        if sampling is None:
+            self._add_node(name, connect_from, text, cluster, title_colour, width)
+            return
+
+        # Skipped calls are only counted by the policy. With measure_time, they still move the time of the chain,
+        # thus the time of the next sampled call is its own and not of all calls since the previous sampled one.
+        weight = sampling.sample(name)
+        if not weight:
+            if self.measure_time:
+                self._chain.touch(time.perf_counter_ns())
+            return
+        start = time.perf_counter_ns()
+        self._add_node(name, connect_from, text, cluster, title_colour, width, weight)
+        with self._lock:
+            if name in self._nodes.ids:
+                self._sampled(self._nodes.ids[name], name, weight)
+        sampling.spent(time.perf_counter_ns() - start)
+
+
+    def _add_node(self, name:str, connect_from, text:str|None, cluster:str|None, title_colour:str, width:float,
+                  weight:float=1):
+        """
+        For adding a node, see add_node(). The weight is the number of calls a sampled call stands for.
 
-
+        :return: Nothing
+        """
         # Prevent duplicating nodes with same name
-        if name in self.nodes:
+        if name in self._nodes.ids and not self.aggregate:
             print(f"(!) Node already exists: {name}")
-        # If node not already exists
-        else:
+            return
+
+        # If text for the node is desired, then format it for a 'prettier' appearance in the node.
+        # This is done before holding the lock, since it is the most expensive part.
+        if text is not None and name not in self._nodes.ids:
+            text = self._format_label(text=text, title_colour=title_colour, width=width)
+
+        with self._lock:
+            self._flush_steps()
+
+            # Check again, since the node could have been added by another thread in the meantime
+            if name in self._nodes.ids and not self.aggregate:
+                print(f"(!) Node already exists: {name}")
             # Not creating node if desired cluster does not exist
-            if (cluster is not None) and (cluster not in self.clusters):
+            elif (cluster is not None) and (cluster not in self._clusters.ids):
                 print(f"Error in creating node '{name}' since cluster '{cluster}' does not exists!")
             # If desired cluster exists for the node
             else:
-                # If text for the node is desired, then format it for a 'prettier' appearance in the node
-                if text is not None:
-                    # 1) Remove more than three ###, ===, --- in string.
-                    pattern = re.compile(r'[#=-]{4,}')
-                    text = pattern.sub('', text)
-                    # 2) For the text inside """´This is a Description: The text starts here,
-                    #                           (  some whitespaces  ) and continues here´ """
-                    # The leading --^ whitespaces will be removed in the node text and and
-                    # also the \n generated by the triple quotes """ """ here.
-                    text = self._collapse_inside_markers(text=text)
-                    # 3) Replace for example (X) -> Ⓧ, (1) -> ①. For numbers possible up to 20
-                    #    Note (XX) -> yields only (X) for example
-                    text = self._replace_with_circles(text=text)
-
-                    # 4) Format the text for the node
-                    text = self._format_text(self._find_lines(text), title_colour=title_colour, text_width=50*width)
-
-                # a) Applied automatic chaining, thus connecting to previous node if desired
+                previous_auto, time_previous = self._get_previous()
+
+                # a) Applied automatic chaining, thus connecting to previous node if desired. It is checked as
+                #    well, since it can be a step which was refused when it was stored.
                 if connect_from == "auto":
-                    previous_node = self.node_previous_auto  # will be None the very first node
-                    self.node_previous_auto = name           # to remember this node for next time
+                    previous_node = self._check_previous(previous_auto)  # will be None the very first node
                 # b) If no connection to previous is applied
                 elif connect_from is None:
-                    self.node_previous_auto = name
                     previous_node = None
 
                 # c) Applies manual chaining, thus previous node is defined by user
                 else:
-                    # Check if previous node(s) existing
-                    # -> Case for list of strings. Remove not existing nodes.
-                    if isinstance(connect_from, list):
-                        missing_list = list(set(connect_from) - self.nodes.keys())
-                        if missing_list:
-                            print(f"Error: The following previous nodes are not existing: {missing_list}")
-                            connect_from = [c for c in connect_from if c in self.nodes.keys()]
-                    # -> Case for only one string. Set to None if not existing.
-                    elif isinstance(connect_from, str):
-                        if connect_from not in self.nodes.keys():
-                            print(f"Error: The following previous node does not exist: {connect_from}")
-                            connect_from = None
-
-                    previous_node = connect_from
-                    self.node_previous_auto = name
-
-                # d) Measure time if defined at beginning
+                    previous_node = self._check_previous(connect_from)
+
+                # d) Measure time if defined at beginning (in seconds, formatted when the graph is created)
                 if self.measure_time:
-                    delta_seconds = time.time() - self.time_start
-                    delta_time_absolute = self._format_delta(delta_seconds=delta_seconds)
+                    now = time.perf_counter_ns()
+                    delta_time_absolute = (now - self._time_start_ns) / 1e9
+                    delta_time_relative = (now - (self._time_start_ns if time_previous is None else time_previous)) / 1e9
+                    time_previous = now
+                else:
+                    delta_time_absolute, delta_time_relative = NAN, NAN
+
+                # e) Measure the memory allocated since the previous node
+                memory = self._memory.measure() if self.measure_memory else NO_MEMORY
+
+                # To remember this node (and its time) for next time in this thread / task
+                self._set_previous((name, time_previous))
+
+                # A repeated node only updates its statistics
+                if name in self._nodes.ids:
+                    self._repeat(name, previous_node, delta_time_relative, weight)
+                    return
+
+                # Finally, store the information of this node
+                i = self._store_node(name, previous_node, cluster, text, delta_time_absolute, delta_time_relative, width,
+                                     memory=memory)
+                self._connect(i, previous_node)
 
-                    if self.time_node_previous is None:
-                        delta_seconds = time.time() - self.time_start
-                        self.time_node_previous = time.time()
-                    else:
-                        delta_seconds = time.time() - self.time_node_previous
-                        self.time_node_previous = time.time()
 
-                    delta_time_relative = self._format_delta(delta_seconds=delta_seconds)
+
+    def _check_previous(self, connect_from):
+        """
+        For removing previous nodes which do not exist.
+
+        :param connect_from: A name or a list of names
+        :return: The existing previous node(s), None if a single name does not exist
+        """
+        # -> Case for list of strings. Remove not existing nodes.
+        if isinstance(connect_from, list):
+            missing_list = list(set(connect_from) - self._nodes.ids.keys())
+            if missing_list:
+                print(f"Error: The following previous nodes are not existing: {missing_list}")
+                connect_from = [c for c in connect_from if c in self._nodes.ids]
+        # -> Case for only one string. Set to None if not existing.
+        elif isinstance(connect_from, str):
+            if connect_from not in self._nodes.ids:
+                print(f"Error: The following previous node does not exist: {connect_from}")
+                connect_from = None
+        return connect_from
+
+
+    def step(self,
+             name:str, *,
+             connect_from:str|list[str]|None="auto",
+             text:str|None=None,
+             cluster:str|None=None,
+             title_colour:str="yellow",
+             width:float=1,
+             sample_key:str|None=None) -> Step:
+        """
+        For timing a block of code as a node. The arguments are the same as for add_node().
+
+            with g.step("Load data", text="Step: Load the data"):
+                data = load()
+
+        * The duration of the block is measured exactly (time.perf_counter_ns()) and labels the edge into the
+          node. It is also available as g.nodes[name]["duration"] in nanoseconds. This is independent of
+          measure_time.
+        * The node is added at the end of the block, thus nested steps are chained in the order they end.
+        * Checking, formatting and storing the node is deferred to the next access of the graph (add_node(),
+          create(), g.nodes, ...), thus it does not add to the timing of the surrounding code. At most
+          easygraph.timing.MAX_PENDING steps are queued, then they are stored at the end of the step.
+        * If the call is not sampled (Graph(sampling=...)), a context manager doing nothing is returned.
+
+        :param sample_key: The key the calls are sampled by, by default the name
+        :return: The context manager
+        """
+        if self.sampling is None:
+            return Step(self, name, connect_from, (text, cluster, title_colour, width))
+        key = name if sample_key is None else sample_key
+        weight = self.sampling.sample(key)
+        if not weight:
+            return _NULL_CONTEXT
+        return Step(self, name, connect_from, (text, cluster, title_colour, width), key, weight)
 
 
+    def timed(self, name:str|None=None, **kwargs):
+        """
+        Decorator for timing each call of a function (also async functions) as a step, see step().
+
+            @g.timed(text="Step: Train the model")
+            def train(model):
+                ...
+
+        :param name: The name of the nodes, by default the qualified name of the function. The second call is
+                     named 'name (2)', the third call 'name (3)', ...
+        :param kwargs: Further arguments of step(), e.g. text, cluster
+        :return: The decorator
+        """
+        return timed(self, name, **kwargs)
+
+
+    def record_calls(self, include=None, exclude=(), max_depth:int|None=None, min_duration:float=0.0,
+                     threads:bool=False) -> "CallRecorder":
+        """
+        For recording the function calls of selected modules as nodes, see CallRecorder.
+
+            with g.record_calls(include=["mypackage"], max_depth=6, min_duration=1e-3):
+                mypackage.main()
+
+        :param include: Names of modules or packages whose functions are recorded, None for all
+        :param exclude: Names of modules or packages which are not recorded
+        :param max_depth: Maximal number of nested recorded calls
+        :param min_duration: Functions with less cumulative time (in seconds) are left out
+        :param threads: If True, also threads started while recording are recorded
+        :return: The CallRecorder, which is used as context manager or with start() and stop()
+        """
+        from .profiler import CallRecorder
+        return CallRecorder(self, include=include, exclude=exclude, max_depth=max_depth,
+                            min_duration=min_duration, threads=threads)
+
+
+    def _flush_steps(self):
+        """
+        For checking, formatting and storing the queued steps, in the order they ended.
+
+        :return: Nothing
+        """
+        if not self._pending_steps:
+            return
+        start = time.perf_counter_ns()
+        with self._lock:
+            while self._pending_steps:
+                step, previous_node, end, memory = self._pending_steps.popleft()
+                name, (text, cluster, title_colour, width) = step.name, step.node
+                if name in self._nodes.ids and not self.aggregate:
+                    print(f"(!) Node already exists: {name}")
+                    continue
+                if (cluster is not None) and (cluster not in self._clusters.ids):
+                    print(f"Error in creating node '{name}' since cluster '{cluster}' does not exists!")
+                    continue
+                if previous_node is not None:
+                    previous_node = self._check_previous(previous_node)
+                if name in self._nodes.ids:
+                    self._repeat(name, previous_node, (end - step.start) / 1e9, step.weight)
                 else:
-                    delta_time_absolute, delta_time_relative = None, None
+                    if text is not None:
+                        text = self._format_label(text=text, title_colour=title_colour, width=width)
 
-                # Finally, store the information of this node in the dict
-                self.nodes[name] = {"connect_from": previous_node,
-                                    "cluster": cluster,
-                                    "text": text,
-                                    "time_absolute": delta_time_absolute,
-                                    "time_relative": delta_time_relative,
-                                    "width": width}
+                    i = self._store_node(name, previous_node, cluster, text,
+                                         (end - self._time_start_ns) / 1e9, (end - step.start) / 1e9, width,
+                                         duration=end - step.start, memory=memory)
+                    self._connect(i, previous_node)
+                if step.key is not None:
+                    self._sampled(self._nodes.ids[name], step.key, step.weight)
 
+        # The time of storing the sampled steps counts for the budget of the sampling
+        if self.sampling is not None:
+            self.sampling.spent(time.perf_counter_ns() - start)
 
 
-    def create(self):
+    def _repeat(self, name:str, connect_from, value:float, weight:float=1):
         """
-        For using the created dictionary to create a graphviz Digraph object.
+        For recording an existing node again (aggregate=True). The measured value is added to the statistics
+        of the node and the edges from the previous nodes are added, if not existing yet. Thus, the memory
+        does not grow with the number of repetitions. The node itself is skipped as previous node, since a
+        node repeated in a loop is chained to itself.
+
+        :param name: The name of the existing node
+        :param connect_from: The checked previous node(s) or None
+        :param value: The measured time in seconds, NaN if not measured
+        :param weight: The number of calls a sampled call stands for
+        :return: Nothing
+        """
+        nodes = self._nodes
+        i = nodes.ids[name]
+        self._add_stats(i, value, weight)
+        if self.journal is not None:
+            self.journal.append(("r", i, value) if weight == 1 else ("r", i, value, weight))
+
+        if connect_from is None:
+            return
+        existing = set(nodes.predecessors(i))
+        for prev in (connect_from if isinstance(connect_from, (list, tuple)) else [connect_from]):
+            if prev != name and nodes.ids[prev] not in existing:
+                self._add_edge(nodes.ids[prev], i)
+                existing.add(nodes.ids[prev])
+
+
+    def _add_stats(self, i:int, value:float, weight:float=1):
+        """
+        For adding a measured value with its weight to the statistics of node i, see _repeat().
 
         :return: Nothing
         """
+        self._stats_of(i).add(value, weight)
+        self._stats_changed = True
 
-        ### section for inner methods of create ### START
-        def depth(name):
-            """
-            For obtaining the level of the cluster in the dictionary.
 
-            :param name: the name of the cluster
-            :return: the depth (thus the level) of the cluster
-            """
+    def _stats_of(self, i:int, weight:float=1) -> RunningStats:
+        """
+        :param weight: The weight of the first recording, used if the statistics are created
+        :return: The statistics of node i, created with its first recording if not existing yet
+        """
+        nodes = self._nodes
+        stats = self._stats.get(i)
+        if stats is None:
+            # The first recording of the node is part of the statistics as well
+            stats = self._stats[i] = RunningStats()
+            if nodes.duration[i] >= 0:
+                stats.add(nodes.duration[i] / 1e9, weight)
+            else:
+                stats.add(nodes.time_relative[i] if nodes.has_time(i) else None, weight)
+        return stats
 
-            d = 0
-            # While supercluster exists get name of it and go one step deeper (thus deeper level)
-            while self.clusters[name]["supercluster"]:
-                name = self.clusters[name]["supercluster"]
-                d += 1
 
-            return d
+    def _sampled(self, i:int, key:str, weight:float):
+        """
+        For linking the statistics of node i, which was recorded by a sampled call, to the counts of the calls of
+        its key. Thus, the labels show the sampled calls and the estimates for all calls. Only if aggregating,
+        since only then node i stands for all sampled calls of the key.
 
-        def lavender_darkness(level: int, levels: int) -> tuple[float, str]:
-            """
-            Return a hex colour of 'lavender' of a different darkness level based on the level and total levels.
-
-            level=1 -> pure lavender, and level=levels -> black.
-
-            :param level: the current level
-            :param levels: the total levels
-            :return: a hex as string representing lavender of a certain darkness level
-            """
-
-            # The base lavender RGB
-            base_r, base_g, base_b = 0xE6, 0xE6, 0xFA
-
-            # For having minimum 2 levels!
-            if levels < 2:
-                raise ValueError("levels must be >= 2")
-
-            # Clamp level into [1, levels]
-            level = max(1, min(level, levels))
-
-            # For compute how far toward black we are, from 0.0 (level=1) to 1.0 (level=levels)
-            frac = (level - 1) / (levels - 1)
-
-            # For interpolating each channel toward 0 (black)
-            r = int(base_r * (1 - frac))
-            g = int(base_g * (1 - frac))
-            b = int(base_b * (1 - frac))
-
-            ratio = frac
-
-            return ratio, f"#{r:02X}{g:02X}{b:02X}"
-
-        ### section for inner methods of create ### END
-
-
-        # 1) For creating raw cluster objects
-        for name, val in self.clusters.items():
-            text = textwrap.fill(val["text"], 50)
-
-            # build an internal graphviz ID that satisfies the rule
-            cid = f"cluster_{name.replace(' ', '_')}" # because cluster name need to start with 'cluster'
-            g = Digraph(name=cid)  # ← use cid, not the label itself
-
-            g.attr(label=f"{name}\\n{text}",
-                   style='rounded,dashed,filled',
-                   color='grey',
-                   fontcolor='grey',
-                   fillcolor='white',
-                   fontname='DejaVu Sans')
-            val["obj"] = g
-
-        # 2) To assign the nodes to their clusters
-        for n, val in self.nodes.items():
-            if val["cluster"]:
-                c = self.clusters[val["cluster"]]["obj"]
-                c.node(n,
-                       label=val["text"],
-                       shape='rect',
-                       style='rounded,filled',
-                       fillcolor='azure',
-                       penwidth='2',
-                       color='black',
-                       fontname="DejaVu Sans")
-
-        # 3) To build the nesting from the bottom up
-        for name in sorted(self.clusters, key=depth, reverse=True):
-            sup = self.clusters[name]["supercluster"]
-            ratio, level_colour = lavender_darkness(level=depth(name) + 1, levels=self.levels)
-
-            # Switch from gray text colout to white to be visible in deeper nested cluster
-            font_colour = "#EEEEEE" if ratio >= 0.2 else "grey"
-
-            # Assign the fill colour and font colour of the respective level
-            self.clusters[name]["obj"].attr(fillcolor=level_colour, fontcolor=font_colour)
-
-            # If supercluster exists of a cluster then nest it
-            if sup:
-                self.clusters[sup]["obj"].subgraph(self.clusters[name]["obj"])
-
-
-        # 4) For dropping the top–level clusters into the root digraph
-        for name, val in self.clusters.items():
-            if val["supercluster"] is None:
-                self.dot.subgraph(val["obj"])
-
-        # 5) Treat nodes that are not in a cluster differently
-        for n, val in self.nodes.items():
-            if val["cluster"] is None:
-                self.dot.node(n, label=val["text"],
-                              shape='rect',
-                              style='rounded,filled',
-                              fillcolor='azure', # 'gray93'
-                              penwidth='2',
-                              fontname="DejaVu Sans")
-
-        # 6) Finally, add the edges between the nodes to generate a directed graph!
-        for n, val in self.nodes.items():
-            # a) If multiple previous nodes are existing, thus list of strings
-            if isinstance(val["connect_from"], list):
-                for edge in val["connect_from"]:
-                    if val["time_absolute"] is not None and val["time_relative"] is not None:
-                        self.dot.edge(edge, n, label=f"Δt={val['time_relative']}\n       ({val['time_absolute']})", fontname='DejaVu Sans', fontsize='10')
+        :param weight: The weight of the call, used if it was the first recording of node i
+        :return: Nothing
+        """
+        if not self.aggregate:
+            return
+        stats = self._stats_of(i, weight)
+        if stats.sampling is None:
+            stats.sampling = self.sampling.counts[key]
+            self._stats_changed = True
+
+
+    def _store_node(self, name, connect_from, cluster, text, time_absolute, time_relative, width, duration=-1,
+                    memory=NO_MEMORY) -> int:
+        """
+        For storing the information of a node which was checked and prepared by add_node() or add_nodes().
+        The edges from the previous nodes are added by _connect().
+
+        :return: The id of the node
+        """
+        if connect_from is None:
+            connect = CONNECT_NONE
+        elif isinstance(connect_from, (list, tuple)):
+            connect = CONNECT_LIST
+        else:
+            connect = CONNECT_SINGLE
+
+        row = (name, self._clusters.ids[cluster] if cluster is not None else -1,
+               text, width, time_absolute, time_relative, connect, duration, memory[0], memory[1])
+        i = self._nodes.add(*row)
+        if memory[2] is not None:
+            self._memory_top[i] = memory[2]
+        if self.journal is not None:
+            self.journal.append(("n",) + row)
+            if memory[2] is not None:
+                self.journal.append(("m", i, memory[2]))
+        self._new_nodes.append(i)
+        return i
+
+
+    def _add_edge(self, src:int, dst:int):
+        """
+        For adding an edge between the node ids src and dst, also to the journal.
+
+        :return: Nothing
+        """
+        self._nodes.add_edge(src, dst)
+        if self.journal is not None:
+            self.journal.append(("e", src, dst))
+
+
+    def _connect(self, i:int, connect_from):
+        """
+        For adding the edges from the previous node(s) to the node with id i. The previous nodes need to exist.
+
+        :return: Nothing
+        """
+        if connect_from is None:
+            return
+        ids = self._nodes.ids
+        if isinstance(connect_from, (list, tuple)):
+            for prev in connect_from:
+                self._add_edge(ids[prev], i)
+        else:
+            self._add_edge(ids[connect_from], i)
+
+
+    def add_clusters(self, clusters):
+        """
+        For adding many clusters at once. Same as calling add_cluster() for each of them.
+
+        :param clusters: Either an iterable of dicts with the keys of add_cluster() (e.g. {"name": "A", "supercluster": "B"})
+                         or of tuples (name, text, supercluster), or columnar data, thus a mapping from these keys to
+                         sequences of equal length (e.g. a dict of lists or a pandas DataFrame).
+        :return: Nothing
+        """
+        for name, text, supercluster in _rows(clusters, _CLUSTER_FIELDS):
+            self.add_cluster(name, text=text, supercluster=supercluster)
+
+
+    def add_nodes(self, nodes):
+        """
+        For adding many nodes at once, e.g. from a recorded trace. Same as calling add_node() for each of them,
+        but all checks are carried out once for the whole batch and each distinct text is only formatted once.
+
+        * The nodes can reference each other via 'connect_from' independent of their order in the batch.
+        * 'auto' chaining follows the order of the batch, starting from the previous created node.
+        * Measured times can be given in seconds via 'time_absolute' and 'time_relative'. Otherwise, if
+          measure_time=True, the time is taken once for the whole batch.
+
+        :param nodes: Either an iterable of dicts with the keys of add_node() (e.g. {"name": "A", "cluster": "B"})
+                      or of tuples (name, connect_from, text, cluster, title_colour, width, time_absolute, time_relative),
+                      or columnar data, thus a mapping from these keys to sequences of equal length (e.g. a dict of
+                      lists or a pandas DataFrame). Missing values (None or NaN) fall back to the defaults of add_node(),
+                      except that 'connect_from'=None means no connection, same as for add_node().
+        :return: Nothing
+        """
+        rows = _rows(nodes, _NODE_FIELDS)
+
+        with self._lock:
+            self._flush_steps()
+
+            # 1) Prevent duplicating nodes with same name, also inside the batch. If aggregating, repeated nodes
+            #    only update their statistics (see below).
+            names, batch = set(), []
+            duplicates = []
+            for row in rows:
+                if row[0] in self._nodes.ids or row[0] in names:
+                    if self.aggregate:
+                        batch.append(row)
                     else:
-                        self.dot.edge(edge, n)
-            # b) If only string is available, thus on previous node
-            elif val["connect_from"]:
-                if val["time_absolute"] is not None and val["time_relative"] is not None:
-                    self.dot.edge(val["connect_from"], n, label=f"Δt={val['time_relative']}\n       ({val['time_absolute']})", fontname='DejaVu Sans', fontsize='10')
+                        duplicates.append(row[0])
                 else:
-                    self.dot.edge(val["connect_from"], n)
+                    names.add(row[0])
+                    batch.append(row)
+            if duplicates:
+                print(f"(!) Nodes already exist: {duplicates}")
+
+            # 2) Not creating nodes if desired cluster does not exist
+            missing_clusters = {row[3] for row in batch} - self._clusters.ids.keys() - {None}
+            if missing_clusters:
+                print(f"Error in creating nodes since clusters {sorted(missing_clusters)} do not exist!")
+                batch = [row for row in batch if row[3] not in missing_clusters]
+                names = {row[0] for row in batch}
+
+            # 3) Check all previous nodes at once. Existing nodes and nodes of this batch are valid.
+            references = set()
+            for row in batch:
+                if isinstance(row[1], list):
+                    references.update(row[1])
+                elif isinstance(row[1], str) and row[1] != "auto":
+                    references.add(row[1])
+            missing = references - self._nodes.ids.keys() - names
+            if missing:
+                print(f"Error: The following previous nodes are not existing: {sorted(missing)}")
+
+            # 4) Format each distinct text only once
+            labels = {}
+            for row in batch:
+                if row[2] is not None and (row[2], row[4], row[5]) not in labels:
+                    labels[(row[2], row[4], row[5])] = self._format_label(text=row[2], title_colour=row[4], width=row[5])
+
+            # 5) Take the time once for the whole batch. The previous node is checked like in add_node().
+            previous_node, time_previous = self._get_previous()
+            previous_node = self._check_previous(previous_node)
+            if self.measure_time:
+                now = time.perf_counter_ns()
+                batch_absolute = (now - self._time_start_ns) / 1e9
+                batch_relative = (now - (self._time_start_ns if time_previous is None else time_previous)) / 1e9
+                time_previous = now
+
+            # 6) Also the memory is measured once, for the first node of the batch
+            memory = self._memory.measure() if self.measure_memory else NO_MEMORY
+
+            edges, repeats = [], []
+            for name, connect_from, text, cluster, title_colour, width, time_absolute, time_relative in batch:
+                # a) Applied automatic chaining, thus connecting to previous node
+                if connect_from == "auto":
+                    connect_from = previous_node
+                # c) Remove not existing previous nodes
+                elif isinstance(connect_from, list):
+                    if missing:
+                        connect_from = [c for c in connect_from if c not in missing]
+                elif connect_from in missing:
+                    connect_from = None
+                previous_node = name
+
+                # d) Given times have priority over the time of the batch
+                if time_absolute is None and self.measure_time:
+                    time_absolute, time_relative = batch_absolute, batch_relative
+                    batch_relative = 0.0
+                if time_absolute is None:
+                    time_absolute, time_relative = NAN, NAN
+                elif time_relative is None:
+                    time_relative = 0.0
+
+                # e) A repeated node (existing or stored before in this batch) is recorded again after the edges
+                if name in self._nodes.ids:
+                    repeats.append((name, connect_from, time_relative))
+                    continue
+
+                text = labels[(text, title_colour, width)] if text is not None else None
+                edges.append((self._store_node(name, connect_from, cluster, text, time_absolute, time_relative, width,
+                                               memory=memory),
+                              connect_from))
+                memory = NO_MEMORY
+            self._set_previous((previous_node, time_previous))
+
+            # The edges are added after all nodes of the batch are stored, since they can reference each other
+            for i, connect_from in edges:
+                self._connect(i, connect_from)
+            for name, connect_from, time_relative in repeats:
+                self._repeat(name, connect_from, time_relative)
+
+
+    def successors(self, name:str) -> list[str]:
+        """
+        For the nodes which are connected from a node, in O(degree).
 
+        :param name: The name of the node
+        :return: The names of the nodes with an edge from this node, in the order the edges were added
+        """
+        with self._lock:
+            self._flush_steps()
+            nodes = self._nodes
+            return list(dict.fromkeys(nodes.names[j] for j in nodes.successors(nodes.ids[name])))
 
 
-    def _format_text(self, text:str, title_colour:str, text_width:int=50) -> str:
+    def predecessors(self, name:str) -> list[str]:
         """
-        For HTML formating different string parts differently. Thuy, certain text blocks are extracted from the input string and are formatted accordingly:
+        For the nodes which are connected to a node, in O(degree).
 
-        *) Step block: centered, bold, background colour ('green', 'yellow', 'red'), text break after 50 letters, blank line after \n
-        *) Description block: left aligned, blank line after, text break after 50 letters \n
-        *) [X] block: yields symbol: ☑. Left aligned, text break after 48 letters, indentation adjusted for enumeration \n
-        *) [ ] block: yields symbol: ☐. Same as previous block
-        *) Note block: yields symbol: ⚠. Same as previous block
+        :param name: The name of the node
+        :return: The names of the nodes with an edge into this node, in the order the edges were added
+        """
+        with self._lock:
+            self._flush_steps()
+            nodes = self._nodes
+            return list(dict.fromkeys(nodes.names[j] for j in nodes.predecessors(nodes.ids[name])))
 
-        :param text: The input test that should be formatted. Need to follow a certain formation. Use \""" Some text \""" and keywords 'Step:', 'Description', '[X]', '[ ]', 'Note', followed by a desired text.
-        :param title_colour: At the moment only 'green', 'yellow', 'red' supported.
-        :return: HTML formatted string
+
+    def ancestors(self, name:str) -> set[str]:
         """
+        For all nodes with a path to a node, e.g. everything a result depends on. The sets are cached, edges added
+        later only drop the cached sets they change.
 
-        BULLETS = ("☐", "☑", "⚠")  # bullet-like symbols
-        GREEN_BG = '#a1ddb2'
-        YELLOW_BG = '#f8ec99'
-        RED_BG = '#ff8080'
+        :param name: The name of the node
+        :return: The names of the nodes
+        """
+        with self._lock:
+            self._flush_steps()
+            nodes = self._nodes
+            return {nodes.names[j] for j in self._closure.ancestors(nodes.ids[name])}
 
-        # Choose the respective colour:
-        if title_colour == "green":
-            STEP_BG = GREEN_BG
-        elif title_colour == "yellow":
-            STEP_BG = YELLOW_BG
-        elif title_colour == "red":
-            STEP_BG = RED_BG
-        else:
-            print(f"Desired colour {title_colour} not yet supported for the title")
 
-        def subst(s) -> str:
-            """
-            For replacing some parts of the string with symbols.
+    def descendants(self, name:str) -> set[str]:
+        """
+        For all nodes with a path from a node, e.g. everything affected by a failed step. Cached like ancestors().
 
-            :param s: The string
-            :return: String containing symbols.
-            """
+        :param name: The name of the node
+        :return: The names of the nodes
+        """
+        with self._lock:
+            self._flush_steps()
+            nodes = self._nodes
+            return {nodes.names[j] for j in self._closure.descendants(nodes.ids[name])}
 
-            return (
-                s.replace('&', '&amp;')  # to be able to use & in HTML formation as text (otherwise master escape)
-                .replace('<', '&lt;')    # to be able to use < in HTML formation as text
-                .replace('>', '&gt;')    # to be able to use > in HTML formation as text
-                .replace("[ ]", "☐")
-                .replace("[X]", "☑")     # for not being case-sensitive
-                .replace("[x]", "☑")     #
-                .replace("Note:", "⚠")
-            )
 
-        BLANK_ROW = '<TR><TD ALIGN="LEFT">&nbsp;</TD></TR>'
+    def topological_order(self) -> list[str]|None:
+        """
+        For ordering all nodes such that each node comes after all nodes with an edge into it, in O(V+E). For graphs
+        recorded in order, this is the order the nodes were added.
 
-        rows = []
+        :return: The names of the nodes, None if the graph has a cycle (e.g. two nodes repeated in turn with
+                 aggregate=True)
+        """
+        with self._lock:
+            self._flush_steps()
+            order = topological_order(self._nodes)
+            if order is None:
+                print("Error: The graph has a cycle, thus there is no topological order!")
+                return None
+            names = self._nodes.names
+            return [names[i] for i in order]
 
-        for raw in text:
-            raw = raw.strip()
-            if not raw:
-                continue
 
-            # 1) FORMATION FOR: STEP / TITLE ==========================================
-            if raw.startswith("Step:"):
-                for part in textwrap.wrap(subst(raw), text_width, break_long_words=True):
-                    rows.append(
-                        f'<TR><TD BGCOLOR="{STEP_BG}" ALIGN="CENTER">'
-                        f'<B>{part}</B></TD></TR>'
-                    )
-                rows.append(BLANK_ROW)  # blank after Step
-                continue
+    def create(self, max_cluster_nodes:int|None=None, max_depth:int|None=None, expand=()):
+        """
+        For using the created dictionary to create a graphviz Digraph object.
 
-            # FORMATION FOR: DESCRIPTION ==============================================
-            if raw.startswith("Description:"):
-                for part in textwrap.wrap(subst(raw), text_width, break_long_words=True):
-                    rows.append(
-                        f'<TR><TD ALIGN="LEFT"><I>{part}</I></TD></TR>'
-                    )
-                rows.append(BLANK_ROW)  # blank after Description
+        * Can be called any time and as often as desired, e.g. to save snapshots of a growing graph. Only
+          the nodes, edges and clusters added since the previous call are appended to the Digraph object.
+        * For big graphs, clusters with more than max_cluster_nodes nodes (including nested clusters) or nested
+          max_depth levels or deeper (0 for the top level) are collapsed into one summary node each. It shows the
+          number of nodes, the nodes per title colour and the total time, and the edges of the nodes inside are
+          rerouted to it. The clusters in expand (and their superclusters) are shown in any case. The Digraph
+          object is then built completely in each call.
+
+            g.create(max_cluster_nodes=500)                    # overview
+            g.create(max_cluster_nodes=500, expand=["Train"])  # look into one cluster
+
+        :param max_cluster_nodes: The maximal number of nodes of a shown cluster, None for no limit
+        :param max_depth: The maximal depth of a shown cluster, None for no limit
+        :param expand: Names of clusters which are not collapsed
+        :return: Nothing
+        """
+
+        # Only the nodes and clusters added since the last call are emitted. Clusters which already
+        # exist in self.dot are opened again (same subgraph name) to append the new content.
+        # Clusters whose supercluster was not added yet, and their nodes, are kept for the next call.
+        from graphviz import Digraph
+        from .dot_writer import (cluster_id, cluster_label, edge_label, node_label, node_attrs, empty_like,
+                                 CLUSTER_ATTRS, NODE_ATTRS, CLUSTER_NODE_ATTRS, EDGE_TIME_ATTRS)
+
+        with self._lock:
+            self._flush_steps()
+
+            if max_cluster_nodes is not None or max_depth is not None or expand:
+                # Everything is emitted again by the next create() without collapsing
+                self.dot = self._collapsed_dot(max_cluster_nodes, max_depth, expand)
+                self._collapsed = True
+                self._stats_changed = False
+                if self.sampling is not None:
+                    self.sampling.changed = False
+                self._new_nodes = list(range(len(self._nodes)))
+                self._new_clusters = list(self._clusters.names)
+                return
+
+            # Changed statistics (also the counts of sampled calls) change nodes and edges which are already in
+            # self.dot, thus build it again
+            if self.sampling is not None and self.sampling.changed:
+                self.sampling.changed = False
+                self._stats_changed = True
+            if self._stats_changed or self._collapsed:
+                self.dot = empty_like(self.dot)
+                self._new_nodes = list(range(len(self._nodes)))
+                self._new_clusters = list(self._clusters.names)
+                self._stats_changed = False
+                self._collapsed = False
+
+            nodes, clusters, depths = self._nodes, self._clusters, self._cluster_depth
+
+            def cluster_of(i):
+                return clusters.names[nodes.cluster[i]] if nodes.cluster[i] >= 0 else None
+
+            ready = [cluster_of(i) is None or cluster_of(i) in depths for i in self._new_nodes]
+            new_nodes = [i for i, r in zip(self._new_nodes, ready) if r]
+            new_clusters = {c for c in self._new_clusters if c in depths}
+            self._new_nodes = [i for i, r in zip(self._new_nodes, ready) if not r]
+            self._new_clusters = [c for c in self._new_clusters if c not in depths]
+            for name in self._new_clusters:
+                print(f"Error: Cluster '{name}' is skipped, since its supercluster does not exist!")
+            if not new_nodes and not new_clusters:
+                return
+
+            # 0) For finding all clusters which receive new content, including all their superclusters
+            touched = set()
+            for name in new_clusters.union(cluster_of(i) for i in new_nodes):
+                while name is not None and name not in touched:
+                    touched.add(name)
+                    name = clusters.supercluster[clusters.ids[name]]
+
+            # 1) For creating raw cluster objects
+            objs = {}
+            for name in touched:
+                # build an internal graphviz ID that satisfies the rule
+                objs[name] = Digraph(name=cluster_id(name))  # ← use the ID, not the label itself
+                if name in new_clusters:
+                    objs[name].attr(label=cluster_label(name, clusters.text[clusters.ids[name]]), **CLUSTER_ATTRS)
+
+            # 2) To assign the nodes to their clusters
+            for i in new_nodes:
+                if cluster_of(i) is not None:
+                    objs[cluster_of(i)].node(nodes.names[i], label=node_label(nodes, i, self._stats.get(i)),
+                                             **node_attrs(nodes, i, CLUSTER_NODE_ATTRS, self.colour_by_memory))
+
+            # 3) To build the nesting from the bottom up
+            self._nest_clusters(objs, touched, new_clusters)
+
+            # 4) Treat nodes that are not in a cluster differently
+            for i in new_nodes:
+                if nodes.cluster[i] < 0:
+                    self.dot.node(nodes.names[i], label=node_label(nodes, i, self._stats.get(i)),
+                              **node_attrs(nodes, i, NODE_ATTRS, self.colour_by_memory))
+
+            # 5) Finally, add the edges between the nodes to generate a directed graph!
+            for i in new_nodes:
+                label = edge_label(nodes, i, self._stats.get(i))
+                for prev in nodes.predecessors(i):
+                    if label is not None:
+                        self.dot.edge(nodes.names[prev], nodes.names[i], label=label, **EDGE_TIME_ATTRS)
+                    else:
+                        self.dot.edge(nodes.names[prev], nodes.names[i])
+
+
+    def _nest_clusters(self, objs:dict, touched:set, new_clusters:set, root:"graphviz.Digraph|None"=None):
+        """
+        For nesting the cluster objects from the bottom up. Each top-level cluster is traversed depth-first and a
+        cluster is nested into its supercluster after all its subclusters are nested into it.
+
+        :param objs: The Digraph object of each touched cluster
+        :param touched: The clusters which receive new content
+        :param new_clusters: The clusters which are new in self.dot, thus get their colours
+        :param root: The Digraph object receiving the top-level clusters, by default self.dot
+        :return: Nothing
+        """
+        from .dot_writer import cluster_colours
+        root = self.dot if root is None else root
+        clusters, depths = self._clusters, self._cluster_depth
+        for top in self._cluster_children[None]:
+            if top not in touched:
                 continue
+            stack = [(top, False)]
+            while stack:
+                name, done = stack.pop()
+                if not done:
+                    stack.append((name, True))
+                    stack.extend((sub, False) for sub in reversed(self._cluster_children.get(name, ()))
+                                 if sub in touched)
+                    continue
+
+                # Assign the fill colour and font colour of the respective level
+                if name in new_clusters:
+                    objs[name].attr(**cluster_colours(level=depths[name] + 1, levels=self.levels))
+
+                # If supercluster exists of a cluster then nest it, otherwise drop it into the root digraph
+                sup = clusters.supercluster[clusters.ids[name]]
+                if sup is not None:
+                    objs[sup].subgraph(objs[name])
+                else:
+                    root.subgraph(objs[name])
 
-            # FORMATION FOR: BULLET / WARNING =========================================
-            line = subst(raw)
-            if line and line[0] in BULLETS:
-                bullet, rest = line[0], line[1:].lstrip()
-                # wrap at 48 chars, but only break on spaces
-                wrapped = textwrap.wrap(rest, text_width-2, break_long_words=True)
-
-                # First line: bullet + single space + first chunk
-                rows.append(
-                    f'<TR><TD ALIGN="LEFT">{bullet}&nbsp;{wrapped[0]}</TD></TR>'
-                )
-
-                # The '&#8203;&nbsp;&nbsp;&nbsp;&nbsp;' is for adding some whitespaces
-                for part in wrapped[1:]:
-                    rows.append(
-                        f'<TR><TD ALIGN="LEFT">&#8203;&nbsp;&nbsp;&nbsp;&nbsp;{part}</TD></TR>'
-                    )
+
+    def _collapsed_dot(self, max_cluster_nodes:int|None, max_depth:int|None, expand,
+                       links:dict|None=None) -> "graphviz.Digraph":
+        """
+        For building a Digraph object of the whole graph, with the big or deep clusters collapsed, see create().
+
+        :param links: The URL of the summary node of each collapsed cluster, if any
+        :return: The Digraph object
+        """
+        from graphviz import Digraph
+        from .dot_writer import (cluster_id, cluster_label, edge_label, node_label, node_attrs, summary_id,
+                                 summary_label, empty_like, CLUSTER_ATTRS, NODE_ATTRS, CLUSTER_NODE_ATTRS,
+                                 EDGE_TIME_ATTRS, SUMMARY_ATTRS)
+        from .summary import collapse
+
+        view = collapse(self, max_nodes=max_cluster_nodes, max_depth=max_depth, expand=expand)
+        nodes, clusters, depths = self._nodes, self._clusters, self._cluster_depth
+        # The settings of self.dot, e.g. g.dot.attr(rankdir="LR"), are kept
+        dot = empty_like(self.dot)
+        links = links or {}
+
+        # 1) The shown clusters. Clusters whose supercluster was not added yet are left out.
+        shown = {name for name in depths if view.owner[clusters.ids[name]] < 0}
+        objs = {}
+        for name in shown:
+            objs[name] = Digraph(name=cluster_id(name))
+            objs[name].attr(label=cluster_label(name, clusters.text[clusters.ids[name]]), **CLUSTER_ATTRS)
+
+        # 2) The summary nodes go into the supercluster of their cluster, the nodes into their shown cluster
+        top_level = []
+        for c, summary in view.summaries.items():
+            name, sup = clusters.names[c], clusters.supercluster[c]
+            attrs = {**SUMMARY_ATTRS, "URL": links[name]} if name in links else SUMMARY_ATTRS
+            if sup is None:
+                top_level.append((summary_id(name), summary_label(name, summary), attrs))
+            else:
+                objs[sup].node(summary_id(name), label=summary_label(name, summary), **attrs)
+        for i in range(len(nodes)):
+            c = nodes.cluster[i]
+            if c < 0:
+                top_level.append((nodes.names[i], node_label(nodes, i, self._stats.get(i)),
+                                  node_attrs(nodes, i, NODE_ATTRS, self.colour_by_memory)))
+            elif clusters.names[c] in shown:
+                objs[clusters.names[c]].node(nodes.names[i], label=node_label(nodes, i, self._stats.get(i)),
+                                             **node_attrs(nodes, i, CLUSTER_NODE_ATTRS, self.colour_by_memory))
+
+        # 3) The nesting, then the nodes and summary nodes which are not in a cluster
+        self._nest_clusters(objs, shown, shown, dot)
+        for name, label, attrs in top_level:
+            dot.node(name, label=label, **attrs)
+
+        # 4) The rerouted edges. Several edges between the same ends are drawn once with their number.
+        def end(e):
+            return summary_id(clusters.names[e[1]]) if isinstance(e, tuple) else nodes.names[e]
+
+        def hidden(e):
+            # Nodes of clusters whose supercluster was not added yet
+            return not isinstance(e, tuple) and nodes.cluster[e] >= 0 and clusters.names[nodes.cluster[e]] not in depths
+
+        for (src, dst), count in view.edges.items():
+            if hidden(src) or hidden(dst):
                 continue
+            label = edge_label(nodes, dst, self._stats.get(dst)) if not isinstance(dst, tuple) else None
+            if count > 1:
+                label = f"{count} edges" if label is None else f"{label}\n{count} edges"
+            if label is not None:
+                dot.edge(end(src), end(dst), label=label, **EDGE_TIME_ATTRS)
+            else:
+                dot.edge(end(src), end(dst))
+        return dot
+
+
+    def __getnewargs_ex__(self):
+        # An unpickled graph is a Graph, also while disabled
+        return (), {"enabled": True}
+
+
+    def __getstate__(self):
+        """
+        For pickling the graph, e.g. to send it from a worker process back to the main process. Only the
+        stored nodes and clusters are pickled (compact columns), not the Digraph object.
+        """
+        self._flush_steps()
+        state = self.__dict__.copy()
+        for key in ("_lock", "_chain", "_dot", "nodes", "clusters", "_new_nodes", "_new_clusters", "_pending_steps",
+                    "_closure"):
+            del state[key]
+        # The journal stays with the process which writes it
+        state["journal"] = None
+        # The chain of the current thread or task is continued by all threads of the unpickled graph. Its time is
+        # pickled relative to the start, since the nanosecond clock differs per process.
+        name, t = self._get_previous()
+        state["_previous"] = (name, None if t is None else t - self._time_start_ns)
+        return state
+
+
+    def __setstate__(self, state):
+        name, t = state.pop("_previous")
+        self.__dict__.update(state)
+        if self.measure_time:
+            self._set_time_start(self.time_start)
+        self._chain = Chain((name, None if t is None else self._time_start_ns + t))
+        self.clusters = ClustersView(self._clusters)
+        self.nodes = NodesView(self._nodes, self._clusters, flush=self._flush_steps, stats=self._stats,
+                               memory_top=self._memory_top)
+        self._lock = threading.RLock()
+        self._pending_steps = collections.deque()
+        self._closure = ClosureCache(self._nodes)
+
+        # Nothing is in the new Digraph object yet, thus create() emits everything
+        self._dot = None
+        self._new_nodes = list(range(len(self._nodes)))
+        self._new_clusters = list(self._clusters.names)
+
+
+    def merge(self, other:"Graph", under_cluster:str|None=None):
+        """
+        For merging all nodes, edges and clusters of another graph into this graph, e.g. graphs recorded in
+        worker processes (Graph objects can be pickled and returned by the workers):
+
+            def work(i):
+                g = Graph(measure_time=True)
+                g.add_node(f"Step {i}")
+                return g
+
+            with ProcessPoolExecutor() as executor:
+                for part in executor.map(work, range(4)):
+                    g.merge(part, under_cluster="Workers")
+
+        * Names of nodes and clusters which already exist in this graph are renamed to 'name (2)', 'name (3)', ...,
+          thus merging the same graphs in the same order always gives the same result.
+        * If both graphs measure the time, the absolute times of the other graph are shifted to the start time
+          of this graph.
+        * The 'auto' chaining of this graph is not changed, thus merged nodes are not connected to existing nodes.
+
+        :param other: The graph to merge into this graph
+        :param under_cluster: If defined, the top-level clusters and the nodes without cluster of the other graph
+                              are put into this cluster. It is created if not existing.
+        :return: Nothing
+        """
+        def unique(name, taken):
+            if name not in taken:
+                return name
+            k = 2
+            while f"{name} ({k})" in taken:
+                k += 1
+            return f"{name} ({k})"
+
+        # Nothing was recorded by a disabled graph
+        if other is NULL_GRAPH:
+            return
+        if other is self:
+            print("Error: A graph can not be merged into itself!")
+            return
+
+        with self._lock, other._lock:
+            self._flush_steps()
+            other._flush_steps()
+            if under_cluster is not None and under_cluster not in self._clusters.ids:
+                self.add_cluster(under_cluster)
+
+            # 1) The clusters, in the order they were added to the other graph, thus superclusters before
+            #    their subclusters (except for clusters added before their supercluster)
+            taken = set(self._clusters.ids)
+            renamed = {}
+            for name in other._clusters.names:
+                renamed[name] = unique(name, taken)
+                taken.add(renamed[name])
+            for name, text, sup in zip(other._clusters.names, other._clusters.text, other._clusters.supercluster):
+                self.add_cluster(renamed[name], text=text, supercluster=renamed.get(sup, under_cluster))
+
+            # 2) The nodes and edges all at once
+            taken = set(self._nodes.ids)
+            names = []
+            for name in other._nodes.names:
+                name = unique(name, taken)
+                taken.add(name)
+                names.append(name)
+            cluster_map = [self._clusters.ids[renamed[name]] for name in other._clusters.names]
+            time_shift = 0.0
+            if self.measure_time and other.measure_time:
+                time_shift = other.time_start - self.time_start
+
+            n0, e0 = len(self._nodes), len(self._nodes.edge_src)
+            self._nodes.extend(other._nodes, names, cluster_map, time_shift=time_shift)
+            # The statistics are copied, since the other graph may still record
+            self._stats.update((i + n0, RunningStats.from_state(stats.state())) for i, stats in other._stats.items())
+            self._memory_top.update((i + n0, top) for i, top in other._memory_top.items())
+            if under_cluster is not None:
+                c = self._clusters.ids[under_cluster]
+                for i in range(n0, len(self._nodes)):
+                    if self._nodes.cluster[i] < 0:
+                        self._nodes.cluster[i] = c
+            self._new_nodes.extend(range(n0, len(self._nodes)))
+
+            # 3) The merged nodes and edges are journaled like added ones
+            if self.journal is not None:
+                nodes = self._nodes
+                for i in range(n0, len(nodes)):
+                    self.journal.append(("n", nodes.names[i], nodes.cluster[i], nodes.text[i], nodes.width[i],
+                                         nodes.time_absolute[i], nodes.time_relative[i], nodes.connect[i],
+                                         nodes.duration[i], nodes.memory_current[i], nodes.memory_peak[i]))
+                    if i in self._memory_top:
+                        self.journal.append(("m", i, self._memory_top[i]))
+                for e in range(e0, len(nodes.edge_src)):
+                    self.journal.append(("e", nodes.edge_src[e], nodes.edge_dst[e]))
+                for i, stats in other._stats.items():
+                    self.journal.append(("s", i + n0, stats.state()))
+
+
+    def dump(self, path):
+        """
+        For saving the model of the graph (clusters, nodes, edges, times, statistics) into a file, e.g. for
+        comparing runs or rendering later with load(). The format is compact and versioned, see easygraph.persist.
+
+        :param path: The path of the file, compressed with gzip if it ends with '.gz'
+        :return: Nothing
+        """
+        with self._lock:
+            self._flush_steps()
+            from . import persist
+            persist.dump(self, path)
 
-            # FORMATION FOR: PLAIN TEXT ===============================================
-            for part in textwrap.wrap(line, text_width, break_long_words=True):
-                rows.append(f'<TR><TD ALIGN="LEFT">{part}</TD></TR>')
 
-        html = (
-                '<TABLE BORDER="0" CELLBORDER="0" CELLPADDING="0">'
-                + "".join(rows)
-                + "</TABLE>"
-        )
-        return f"<{html}>"
+    @classmethod
+    def load(cls, path) -> "Graph":
+        """
+        For loading a graph saved with dump(). The file is read in chunks and the columns of the nodes are
+        copied as a whole, thus much faster than adding the nodes again with add_node().
 
+            g = Graph.load("run.eg.gz")
+            g.create()
+            g.save("examples/run")
 
-    def _find_lines(self, text) -> list[str]:
+        :param path: The path of the file
+        :return: The new Graph object
         """
-        For finding the individual lines of the string and extract it.
+        from . import persist
+        with persist._open(path, "r") as f:
+            header = persist.read_header(f)
+            graph = cls(measure_time=header["measure_time"], levels=header["levels"], aggregate=header["aggregate"],
+                        measure_memory=header["measure_memory"], colour_by_memory=header["colour_by_memory"],
+                        enabled=True)
+            if header["time_start"] is not None:
+                graph._set_time_start(header["time_start"])
+            persist.load_into(graph, f, header)
+        graph.node_previous_auto = header["previous"]
+        return graph
+
+
+    @classmethod
+    def replay(cls, journal) -> "Graph":
+        """
+        For rebuilding a graph from its journal (see Graph(journal=...)), e.g. after the job crashed. The events
+        are applied in the order they were recorded, until the end of the journal or an incompletely written event.
+
+            g = Graph.replay("run.journal")
+            g.create()
+            g.save("examples/run")
 
-        :param text: whole input string
-        :return: Returns list of strings.
+        :param journal: The path of the journal, or the Journal object
+        :return: The new Graph object, without journal
         """
-        text = textwrap.dedent(text)    # removes the common left margin
-        return [ln.lstrip()             # keep keywords flush-left
-                for ln in text.splitlines()
-                if ln.strip()]          # drop blank lines
+        from .journal import Journal, read
+        path = journal.path if isinstance(journal, Journal) else journal
+        graph, previous = None, None
+        for header, event in read(path):
+            if graph is None:
+                graph = cls(measure_time=header["measure_time"], levels=header["levels"],
+                            aggregate=header["aggregate"], measure_memory=header["measure_memory"],
+                            colour_by_memory=header["colour_by_memory"], enabled=True)
+                if header["time_start"] is not None:
+                    graph._set_time_start(header["time_start"])
+            kind = event[0]
+            if kind == "n":
+                row = [NAN if v is None else v for v in event[4:]]
+                graph._new_nodes.append(graph._nodes.add(event[1], event[2], event[3], *row))
+                previous = event[1]
+            elif kind == "e":
+                graph._nodes.add_edge(event[1], event[2])
+            elif kind == "c":
+                graph.add_cluster(event[1], text=event[2], supercluster=event[3])
+            elif kind == "r":
+                graph._add_stats(event[1], *event[2:])
+                previous = graph._nodes.names[event[1]]
+            elif kind == "s":
+                graph._stats[event[1]] = RunningStats.from_state(event[2])
+                graph._stats_changed = True
+            elif kind == "m":
+                graph._memory_top[event[1]] = event[2]
+            else:
+                raise ValueError(f"Unknown event {kind!r} in the journal")
+
+        if graph is None:
+            print(f"Error: The journal '{path}' does not exist or is empty!")
+            return cls(enabled=True)
+        graph.node_previous_auto = previous
+        return graph
 
 
-    def save(self, name, format:str='svg'):
+    def write_dot(self, file):
+        """
+        For writing the DOT source of the graph directly into a file, without building Digraph objects.
+        Thus, also usable for very big graphs. Does not require calling create() before.
+
+        :param file: A path or a file-like object with a write() method
+        :return: Nothing
+        """
+        from .dot_writer import write_dot
+        with self._lock:
+            self._flush_steps()
+            write_dot(self, file)
+
+
+    def save(self, name, format:str|list[str]='svg', backend:str="digraph", max_workers:int|None=None,
+             cache:"RenderCache|None"=None, partition:str|None=None):
         """
         For saving the graph which is created as image.
 
+        * With backend='digraph' the Digraph object of create() is rendered. With backend='stream' the
+          DOT source is written directly into the file 'name' (see write_dot()) and rendered from there,
+          thus create() is not required.
+        * With a list of formats, the source is written once and the images are rendered in parallel
+          (see render_many()).
+        * With a RenderCache, graphviz only runs if the same source was not rendered into the same format
+          before. Otherwise, the cached image is copied.
+        * With partition='cluster', each top-level cluster is rendered into its own file 'name_<cluster>' and
+          'name' shows an overview linking to them. The layouts run in parallel, see render_partitions().
+          create() is not required.
+
         :param name: name of the file
-        :return: Nothing
+        :param format: the format of the image, e.g. 'svg', 'png' or 'pdf', or a list of formats
+        :param backend: 'digraph' or 'stream'
+        :param max_workers: The number of formats rendered at once, if a list of formats is given
+        :param cache: A RenderCache, or None for always rendering
+        :param partition: None for one image, 'cluster' for one image per top-level cluster
+        :return: Nothing, or for a list of formats, with a cache or partitions a dict per file and format with
+                 'file', 'format', 'seconds', 'cached' and 'error'
+        """
+        from .render import render_many, render_partitions
+        if partition == "cluster":
+            return render_partitions(self, name, formats=format, max_workers=max_workers, cache=cache)
+        if partition is not None:
+            print(f"Error: Partition '{partition}' is not supported! Use None or 'cluster'.")
+            return None
+        if not isinstance(format, str) or cache is not None:
+            return render_many({name: self}, formats=format, max_workers=max_workers, backend=backend, cache=cache)
+
+        if backend == "stream":
+            self.write_dot(name)
+            try:
+                import graphviz
+                graphviz.render("dot", format, name)
+            finally:
+                os.remove(name)
+        elif backend == "digraph":
+            self.dot.render(name, format=format, cleanup=True)
+        else:
+            print(f"Error: Backend '{backend}' is not supported! Use 'digraph' or 'stream'.")
+
+
+    async def asave(self, name, format:str='svg', backend:str="digraph", timeout:float|None=None):
+        """
+        Same as save(), but for asyncio applications, thus the event loop is not blocked while graphviz runs.
+        Several graphs can be saved concurrently, e.g. with asyncio.gather(), whereby at most
+        easygraph.render.RENDER_LIMIT layout subprocesses run at once.
+
+        :param name: name of the file
+        :param format: the format of the image, e.g. 'svg', 'png' or 'pdf'
+        :param backend: 'digraph' (Digraph object of create()) or 'stream' (see write_dot())
+        :param timeout: Seconds after which the rendering is stopped with a TimeoutError, None for no limit
+        :return: The path of the image
         """
-        self.dot.render(name, format=format, cleanup=True)
+        if backend not in ("digraph", "stream"):
+            print(f"Error: Backend '{backend}' is not supported! Use 'digraph' or 'stream'.")
+            return None
+        import asyncio
+        from .render import arender
+
+        # Generating the source takes seconds for big graphs, thus it runs in a thread of the default executor
+        source = await asyncio.get_running_loop().run_in_executor(None, self._source, backend)
+        return await arender(source, name, format=format, timeout=timeout)
 
+
+    def _source(self, backend:str) -> str:
+        """
+        :param backend: 'digraph' (Digraph object of create()) or 'stream' (see write_dot())
+        :return: The DOT source
+        """
+        if backend == "stream":
+            buffer = io.StringIO()
+            self.write_dot(buffer)
+            return buffer.getvalue()
+        with self._lock:
+            return self.dot.source
@@ -0,0 +1,421 @@
+"""
+For writing the DOT source of a Graph directly into a file, cluster by cluster, without building graphviz
+Digraph objects. The written source is the same as the one generated by Graph.create().
+"""
+import html
+import re
+import textwrap
+
+from graphviz.quoting import quote, quote_edge, a_list, attr_list
+
+from .formatting import format_delta, format_bytes, BLANK_ROW, TITLE_COLOURS
+
+
+CLUSTER_ATTRS = {"style": 'rounded,dashed,filled',
+                 "color": 'grey',
+                 "fontcolor": 'grey',
+                 "fillcolor": 'white',
+                 "fontname": 'DejaVu Sans'}
+
+NODE_ATTRS = {"shape": 'rect',
+              "style": 'rounded,filled',
+              "fillcolor": 'azure', # 'gray93'
+              "penwidth": '2',
+              "fontname": "DejaVu Sans"}
+
+# Nodes inside a cluster get a black border explicitly
+CLUSTER_NODE_ATTRS = {**NODE_ATTRS, "color": 'black'}
+
+EDGE_TIME_ATTRS = {"fontname": 'DejaVu Sans',
+                   "fontsize": '10'}
+
+# Summary nodes of collapsed clusters (Graph.create(max_cluster_nodes=..., max_depth=...))
+SUMMARY_ATTRS = {**NODE_ATTRS, "shape": 'folder', "fillcolor": 'lavender', "color": 'grey'}
+
+# Nodes of other partitions (Graph.save(partition='cluster'))
+STUB_ATTRS = {"shape": 'rect',
+              "style": 'rounded,dashed',
+              "color": 'grey',
+              "fontcolor": 'grey',
+              "fontname": 'DejaVu Sans'}
+
+# Fill colours of nodes by the peak of allocated memory (Graph(colour_by_memory=True)), from the upper bound in bytes
+MEMORY_COLOURS = ((2**20, None),         # below 1 MiB: the usual colour
+                  (10 * 2**20, '#fff3c4'),
+                  (100 * 2**20, '#ffd59e'),
+                  (float("inf"), '#ffa8a8'))
+
+
+def _is_attribute(line:str) -> bool:
+    """
+    :param line: A line of the body of a Digraph object
+    :return: True if it is a top-level attribute statement, e.g. of dot.attr(rankdir="LR") or dot.attr("node", shape="box")
+    """
+    if not line.startswith("\t") or line.startswith("\t\t"):
+        return False
+    statement = line[1:]
+    if statement.startswith(("graph [", "node [", "edge [")):
+        return True
+    # 'name=value', the name is unquoted and not the start of a node, edge or subgraph statement
+    name, equal, _ = statement.partition("=")
+    return bool(equal and name) and not any(c in name for c in ' "[{')
+
+
+def empty_like(dot):
+    """
+    For a new Digraph object without nodes, edges and clusters, but with the settings of dot: its attributes (also
+    those set with dot.attr()), layout engine, format and file name. Thus, the settings of Graph.dot survive
+    building it again.
+
+    :param dot: The graphviz Digraph object
+    :return: The new Digraph object
+    """
+    new = dot.copy()
+    new.body = [line for line in dot.body if _is_attribute(line)]
+    return new
+
+
+def lavender_darkness(level: int, levels: int) -> tuple[float, str]:
+    """
+    Return a hex colour of 'lavender' of a different darkness level based on the level and total levels.
+
+    level=1 -> pure lavender, and level=levels -> black.
+
+    :param level: the current level
+    :param levels: the total levels
+    :return: a hex as string representing lavender of a certain darkness level
+    """
+
+    # The base lavender RGB
+    base_r, base_g, base_b = 0xE6, 0xE6, 0xFA
+
+    # For having minimum 2 levels!
+    if levels < 2:
+        raise ValueError("levels must be >= 2")
+
+    # Clamp level into [1, levels]
+    level = max(1, min(level, levels))
+
+    # For compute how far toward black we are, from 0.0 (level=1) to 1.0 (level=levels)
+    frac = (level - 1) / (levels - 1)
+
+    # For interpolating each channel toward 0 (black)
+    r = int(base_r * (1 - frac))
+    g = int(base_g * (1 - frac))
+    b = int(base_b * (1 - frac))
+
+    ratio = frac
+
+    return ratio, f"#{r:02X}{g:02X}{b:02X}"
+
+
+def cluster_id(name: str) -> str:
+    """
+    For building an internal graphviz ID of a cluster, since the name of a cluster needs to start with 'cluster'.
+
+    :param name: The name of the cluster
+    :return: The graphviz ID
+    """
+    return f"cluster_{name.replace(' ', '_')}"
+
+
+def cluster_label(name: str, text: str) -> str:
+    """
+    :param name: The name of the cluster
+    :param text: The description of the cluster
+    :return: The label of the cluster, with the description broken after 50 letters
+    """
+    return f"{name}\\n{textwrap.fill(text, 50)}"
+
+
+def cluster_colours(level: int, levels: int) -> dict:
+    """
+    For the fill colour and the font colour of a cluster at a certain nesting level (1 = top level).
+
+    :param level: the level of the cluster
+    :param levels: the total levels
+    :return: dict with 'fillcolor' and 'fontcolor'
+    """
+    ratio, level_colour = lavender_darkness(level=level, levels=levels)
+
+    # Switch from gray text colout to white to be visible in deeper nested cluster
+    font_colour = "#EEEEEE" if ratio >= 0.2 else "grey"
+
+    return {"fillcolor": level_colour, "fontcolor": font_colour}
+
+
+def summary_id(name: str) -> str:
+    """
+    :param name: The name of a collapsed cluster
+    :return: The graphviz ID of its summary node
+    """
+    return f"{cluster_id(name)}_summary"
+
+
+def summary_label(name: str, summary) -> str:
+    """
+    :param name: The name of the collapsed cluster
+    :param summary: The ClusterSummary of the cluster
+    :return: The HTML label of the summary node: name, number of nodes and clusters, number of nodes per
+             title colour and the total time
+    """
+    rows = [f'<TR><TD ALIGN="CENTER"><B>{html.escape(name, quote=False)}</B></TD></TR>', BLANK_ROW]
+    content = f"{summary.nodes} nodes"
+    if summary.clusters:
+        content += f" in {summary.clusters + 1} clusters"
+    rows.append(f'<TR><TD ALIGN="LEFT">{content}</TD></TR>')
+    for status, colour in TITLE_COLOURS.items():
+        if summary.status.get(status):
+            rows.append(f'<TR><TD BGCOLOR="{colour}" ALIGN="LEFT">{status}: {summary.status[status]}</TD></TR>')
+    if summary.time is not None:
+        rows.append(f'<TR><TD ALIGN="LEFT">Σt={format_delta(summary.time)}</TD></TR>')
+    return '<<TABLE BORDER="0" CELLBORDER="0" CELLPADDING="0">' + "".join(rows) + "</TABLE>>"
+
+
+def stats_lines(stats) -> list[str]:
+    """
+    :param stats: The RunningStats of a node
+    :return: The lines describing the statistics, e.g. ['n=1000  Σ=1.2 s', 'mean=1.2 ms  min=...', ...]. If sampled,
+             the count, total and mean are estimated for all calls by the weights of the recordings (n≈, Σ≈, mean≈)
+             and the sampled calls are shown.
+    """
+    if stats.sampling is not None:
+        seen, sampled = stats.sampling
+        count = f"n≈{stats.estimated_count}  sampled {sampled}/{seen}"
+        if not stats.measured:
+            return [count]
+        return [count,
+                f"Σ≈{format_delta(stats.estimated_total)}  mean≈{format_delta(stats.mean)}",
+                f"min={format_delta(stats.min)}  max={format_delta(stats.max)}",
+                f"p50={format_delta(stats.p50)}  p95={format_delta(stats.p95)}"]
+    if not stats.measured:
+        return [f"n={stats.count}"]
+    return [f"n={stats.count}  Σ={format_delta(stats.total)}",
+            f"mean={format_delta(stats.mean)}  min={format_delta(stats.min)}  max={format_delta(stats.max)}",
+            f"p50={format_delta(stats.p50)}  p95={format_delta(stats.p95)}"]
+
+
+def node_label(nodes, i:int, stats=None) -> str|None:
+    """
+    :param nodes: The NodeStore of the graph
+    :param i: The id of the node
+    :param stats: The RunningStats of the node, if it was recorded repeatedly
+    :return: The label of the node, with the statistics appended if it was recorded more than once or stands for
+             several sampled calls
+    """
+    text = nodes.text[i]
+    if stats is None or (stats.count < 2 and stats.scale == 1.0):
+        return text
+    if text is None:
+        text = f'<<TABLE BORDER="0" CELLBORDER="0" CELLPADDING="0"><TR><TD>{html.escape(nodes.names[i], quote=False)}</TD></TR></TABLE>>'
+    rows = "".join(f'<TR><TD ALIGN="LEFT"><FONT POINT-SIZE="10">{line}</FONT></TD></TR>' for line in stats_lines(stats))
+    return text[:-len("</TABLE>>")] + BLANK_ROW + rows + "</TABLE>>"
+
+
+def edge_label(nodes, i:int, stats=None) -> str|None:
+    """
+    :param nodes: The NodeStore of the graph
+    :param i: The id of the node
+    :param stats: The RunningStats of the node, if it was recorded repeatedly
+    :return: The label for the edges into the node, or None if no time was measured
+    """
+    if stats is not None and (stats.count >= 2 or stats.scale != 1.0):
+        return "\n".join(stats_lines(stats))
+    label = None
+    if nodes.has_time(i):
+        label = f"Δt={format_delta(nodes.time_relative[i])}\n       ({format_delta(nodes.time_absolute[i])})"
+    if nodes.has_memory(i):
+        memory = (f"mem={format_bytes(nodes.memory_current[i], sign=True)}"
+                  f"\n       (peak {format_bytes(nodes.memory_peak[i], sign=True)})")
+        label = memory if label is None else f"{label}\n{memory}"
+    return label
+
+
+def node_attrs(nodes, i:int, attrs:dict, colour_by_memory:bool=False) -> dict:
+    """
+    :param nodes: The NodeStore of the graph
+    :param i: The id of the node
+    :param attrs: The usual attributes of the node (NODE_ATTRS or CLUSTER_NODE_ATTRS)
+    :param colour_by_memory: If True, the fill colour depends on the peak of allocated memory
+    :return: The attributes of the node
+    """
+    if colour_by_memory and nodes.has_memory(i):
+        for bound, colour in MEMORY_COLOURS:
+            if nodes.memory_peak[i] < bound:
+                if colour is not None:
+                    return {**attrs, "fillcolor": colour}
+                break
+    return attrs
+
+
+def _open_write(file):
+    """
+    :param file: A path or a file-like object with a write() method
+    :return: (the opened file or None, the write function)
+    """
+    if isinstance(file, str) or hasattr(file, "__fspath__"):
+        f = open(file, "w", encoding="utf-8")
+        return f, f.write
+    return None, file.write
+
+
+def _cluster_writer(graph, write, members:dict):
+    """
+    :param graph: The easygraph Graph object
+    :param write: The write function
+    :param members: The ids of the nodes of each cluster id
+    :return: A function writing a cluster completely (own attributes, nodes and nested clusters)
+    """
+    nodes, clusters, stats = graph._nodes, graph._clusters, graph._stats
+    colour, names, children = graph.colour_by_memory, graph._nodes.names, graph._cluster_children
+
+    def write_cluster(name: str, level: int):
+        c = clusters.ids[name]
+        indent = "\t" * level
+        write(f"{indent}subgraph {quote(cluster_id(name))} {{\n")
+        write(f"{indent}\t{a_list(None, kwargs={'label': cluster_label(name, clusters.text[c]), **CLUSTER_ATTRS})}\n")
+        for i in members.get(c, ()):
+            attrs = attr_list(node_label(nodes, i, stats.get(i)), kwargs=node_attrs(nodes, i, CLUSTER_NODE_ATTRS, colour))
+            write(f"{indent}\t{quote(names[i])}{attrs}\n")
+        for sub in children.get(name, ()):
+            write_cluster(sub, level + 1)
+        write(f"{indent}\t{a_list(None, kwargs=cluster_colours(level=level, levels=graph.levels))}\n")
+        write(f"{indent}}}\n")
+
+    return write_cluster
+
+
+def _edge_line(graph, src:int, dst:int) -> str:
+    nodes = graph._nodes
+    label = edge_label(nodes, dst, graph._stats.get(dst))
+    attrs = attr_list(label, kwargs=EDGE_TIME_ATTRS) if label is not None else ''
+    return f"\t{quote_edge(nodes.names[src])} -> {quote_edge(nodes.names[dst])}{attrs}\n"
+
+
+def write_dot(graph, file):
+    """
+    For writing the DOT source of the graph. Each cluster is written completely (own attributes, nodes and
+    nested clusters) before the next one, thus the whole source is never held in memory.
+
+    :param graph: The easygraph Graph object
+    :param file: A path or a file-like object with a write() method
+    :return: Nothing
+    """
+    f, write = _open_write(file)
+    try:
+        nodes, stats = graph._nodes, graph._stats
+        colour = graph.colour_by_memory
+        names = nodes.names
+
+        # 1) For grouping the nodes by cluster in one pass. The subclusters are known from the cluster index.
+        members = {}
+        for i, c in enumerate(nodes.cluster):
+            members.setdefault(c, []).append(i)
+        write_cluster = _cluster_writer(graph, write, members)
+
+        write("digraph {\n")
+
+        # 2) The top-level clusters, each with all nested clusters and nodes
+        for name in graph._cluster_children[None]:
+            write_cluster(name, 1)
+
+        # 3) Nodes that are not in a cluster
+        for i in members.get(-1, ()):
+            attrs = attr_list(node_label(nodes, i, stats.get(i)), kwargs=node_attrs(nodes, i, NODE_ATTRS, colour))
+            write(f"\t{quote(names[i])}{attrs}\n")
+
+        # 4) The edges between the nodes
+        for i in range(len(nodes)):
+            for prev in nodes.predecessors(i):
+                write(_edge_line(graph, prev, i))
+
+        write("}\n")
+    finally:
+        if f is not None:
+            f.close()
+
+
+# Characters which are replaced in the file names of partitions
+_UNSAFE = re.compile(r'[^\w.-]')
+
+
+def partition_names(graph, name:str) -> dict[str, str]:
+    """
+    :param graph: The easygraph Graph object
+    :param name: The name of the file of the overview
+    :return: The file name of each top-level cluster, e.g. 'name_Training' for the cluster 'Training'
+    """
+    files, taken = {}, {name}
+    for top in graph._cluster_children[None]:
+        file = base = f"{name}_{_UNSAFE.sub('_', top)}"
+        k = 2
+        while file in taken:
+            file = f"{base}_{k}"
+            k += 1
+        files[top] = file
+        taken.add(file)
+    return files
+
+
+def write_partitions(graph, files:dict[str, str], links:dict[str, str]|None=None):
+    """
+    For writing the DOT source of each top-level cluster into its own file (see Graph.save(partition='cluster')).
+    Edges to nodes of other partitions or without cluster go to stub nodes, which are dashed and link to
+    the file of their partition. All files are written with one pass over the nodes and the edges.
+
+    :param graph: The easygraph Graph object
+    :param files: The file name of each top-level cluster, see partition_names()
+    :param links: The URL of each top-level cluster (None for the overview) used by the stub nodes
+    :return: Nothing
+    """
+    nodes, clusters = graph._nodes, graph._clusters
+    links = links or {}
+
+    # 1) The top-level cluster of each cluster, from the cluster index
+    top_of = [None] * len(clusters)
+    stack = [(top, top) for top in graph._cluster_children[None]]
+    while stack:
+        name, top = stack.pop()
+        top_of[clusters.ids[name]] = top
+        stack.extend((sub, top) for sub in graph._cluster_children.get(name, ()))
+
+    def partition(i):
+        return top_of[nodes.cluster[i]] if nodes.cluster[i] >= 0 else None
+
+    # 2) The nodes of each cluster and the edges of each partition, in the order of write_dot()
+    members = {}
+    for i, c in enumerate(nodes.cluster):
+        members.setdefault(c, []).append(i)
+    edges, stubs = {top: [] for top in files}, {top: {} for top in files}
+    for i in range(len(nodes)):
+        dst = partition(i)
+        for prev in nodes.predecessors(i):
+            src = partition(prev)
+            if dst in edges:
+                edges[dst].append((prev, i))
+                if src != dst:
+                    stubs[dst][prev] = src
+            if src != dst and src in edges:
+                edges[src].append((prev, i))
+                stubs[src][i] = dst
+
+    # 3) One file per top-level cluster
+    for top, file in files.items():
+        with open(file, "w", encoding="utf-8") as f:
+            write = f.write
+            write("digraph {\n")
+            _cluster_writer(graph, write, members)(top, 1)
+            for i, other in stubs[top].items():
+                label = f"{nodes.names[i]}\\n({other if other is not None else 'overview'})"
+                write(f"\t{quote(nodes.names[i])}{attr_list(label, kwargs=stub_attrs(links.get(other)))}\n")
+            for src, dst in edges[top]:
+                write(_edge_line(graph, src, dst))
+            write("}\n")
+
+
+def stub_attrs(url:str|None) -> dict:
+    """
+    :param url: The URL of the file showing the node, or None
+    :return: The attributes of a stub node, thus a node of another partition
+    """
+    return {**STUB_ATTRS, "URL": url} if url is not None else STUB_ATTRS
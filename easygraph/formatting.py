@@ -0,0 +1,247 @@
+"""
+For turning the comment-like text of a node into the HTML label used by graphviz. All patterns, tables and
+wrappers are prepared once, thus formatting a label is a single pass over the lines of the text.
+
+The patterns are compiled (and re, textwrap imported) when the first label is formatted, thus importing
+easygraph stays fast.
+"""
+
+# Only for the annotations, see directed_graph.py
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import re
+
+# Separators like ####, ====, ---- are removed from the text
+_SEPARATOR = None
+
+# Text inside ´ ´ is collapsed into one line
+_MARKER_BLOCK = None
+
+# Enumerations like (1), (A), (a) are replaced by circled characters
+_ENUMERATION = None
+_CIRCLED = {**{str(i): chr(0x2460 + i - 1) for i in range(1, 21)},           # ①–⑳ for (1)–(20)
+            **{chr(ord('A') + i): chr(0x24B6 + i) for i in range(26)},     # Ⓐ–Ⓩ for (A)–(Z)
+            **{chr(ord('a') + i): chr(0x24D0 + i) for i in range(26)}}     # ⓐ–ⓩ for (a)–(z)
+
+# To be able to use &, <, > as text in the HTML formation
+_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Keywords which are replaced by symbols
+_SYMBOL_KEYWORDS = None
+_SYMBOLS = {"[ ]": "☐", "[X]": "☑", "[x]": "☑", "Note:": "⚠"}
+
+BULLETS = ("☐", "☑", "⚠")  # bullet-like symbols
+TITLE_COLOURS = {"green": '#a1ddb2',
+                 "yellow": '#f8ec99',
+                 "red": '#ff8080'}
+
+BLANK_ROW = '<TR><TD ALIGN="LEFT">&nbsp;</TD></TR>'
+
+# One text wrapper per width, since creating them is more expensive than wrapping short lines
+_wrappers = {}
+
+
+def _compile():
+    """
+    For compiling the patterns on first use.
+
+    :return: Nothing
+    """
+    global _SEPARATOR, _MARKER_BLOCK, _ENUMERATION, _SYMBOL_KEYWORDS
+    import re
+    _MARKER_BLOCK = re.compile('´\\s*([\\s\\S]*?)\\s*´')
+    _ENUMERATION = re.compile(r'\((?P<inner>[^)]+)\)')
+    _SYMBOL_KEYWORDS = re.compile(r'\[ \]|\[[Xx]\]|Note:')
+    # Set last, since it marks the patterns as compiled
+    _SEPARATOR = re.compile(r'[#=-]{4,}')
+
+
+def format_delta(delta_seconds: float) -> str:
+    """
+    Format a time interval in seconds into the most appropriate unit:
+    ns, μs, ms, s, min, or h.
+    """
+    # nanoseconds
+    if delta_seconds < 1e-6:
+        value = delta_seconds * 1e9
+        unit = "ns"
+    # microseconds
+    elif delta_seconds < 1e-3:
+        value = delta_seconds * 1e6
+        unit = "μs"
+    # milliseconds
+    elif delta_seconds < 1.0:
+        value = delta_seconds * 1e3
+        unit = "ms"
+    # seconds
+    elif delta_seconds < 60.0:
+        value = delta_seconds
+        unit = "s"
+    # minutes
+    elif delta_seconds < 3600.0:
+        value = delta_seconds / 60.0
+        unit = "min"
+    # hours (and beyond)
+    else:
+        value = delta_seconds / 3600.0
+        unit = "h"
+
+    # Format with up to three significant digits
+    fmt = f"{value:.3g} {unit}"
+    return fmt
+
+
+def format_bytes(size: float, sign: bool = False) -> str:
+    """
+    Format a number of bytes into the most appropriate unit: B, KiB, MiB or GiB.
+
+    :param size: The number of bytes
+    :param sign: If True, a '+' is put in front of positive numbers
+    :return: The formatted size
+    """
+    value = abs(size)
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            break
+        value /= 1024
+    else:
+        unit = "GiB"
+    prefix = "-" if size < 0 else ("+" if sign and size > 0 else "")
+    number = f"{value:.3g}" if value < 1000 else f"{value:.0f}"
+    return f"{prefix}{number} {unit}"
+
+
+def _collapse_block(m: "re.Match") -> str:
+    # strip each line and drop empty ones
+    return " ".join([ln.strip() for ln in m.group(1).splitlines() if ln.strip()])
+
+
+def _circle(m: "re.Match") -> str:
+    # Everything else (including "XX", "a1", "21", etc.): leave unchanged
+    return _CIRCLED.get(m.group('inner'), m.group(0))
+
+
+def _symbol(m: "re.Match") -> str:
+    return _SYMBOLS[m.group(0)]
+
+
+def _subst(s: str) -> str:
+    """
+    For escaping the HTML characters and replacing the keywords with symbols.
+
+    :param s: The string
+    :return: String containing symbols.
+    """
+    s = s.translate(_ESCAPE)
+    if '[' in s or 'Note:' in s:
+        s = _SYMBOL_KEYWORDS.sub(_symbol, s)
+    return s
+
+
+def _wrap(s: str, width: int) -> list[str]:
+    """
+    Same as textwrap.wrap(s, width, break_long_words=True), but lines that fit are returned directly.
+
+    :param s: A single stripped line
+    :param width: The maximal width of the line
+    :return: List of wrapped lines
+    """
+    # A non-empty line without tabs and shorter than the width remains a single line
+    if s and len(s) <= width and '\t' not in s:
+        return [s]
+
+    wrapper = _wrappers.get(width)
+    if wrapper is None:
+        import textwrap
+        wrapper = _wrappers[width] = textwrap.TextWrapper(width, break_long_words=True)
+    return wrapper.wrap(s)
+
+
+def prepare_text(text: str) -> str:
+    """
+    For preparing the comment-like string of a node:
+
+    1) Remove more than three ###, ===, --- in string.
+    2) For the text inside \"\"\"´This is a Description: The text starts here,
+                                (  some whitespaces  ) and continues here´ \"\"\"
+       The leading --^ whitespaces will be removed in the node text and also the \\n generated by the
+       triple quotes \"\"\" \"\"\" here.
+    3) Replace for example (X) -> Ⓧ, (1) -> ①. For numbers possible up to 20.
+       Note (XX) -> remains (XX)
+
+    :param text: The input string
+    :return: The prepared string
+    """
+    if _SEPARATOR is None:
+        _compile()
+    text = _SEPARATOR.sub('', text)
+    if '´' in text:
+        text = _MARKER_BLOCK.sub(_collapse_block, text)
+    if '(' in text:
+        text = _ENUMERATION.sub(_circle, text)
+    return text
+
+
+def format_label(text: str, title_colour: str, text_width: float = 50) -> str:
+    """
+    For HTML formating different string parts differently. Thus, certain text blocks are extracted from the
+    input string and are formatted accordingly:
+
+    *) Step block: centered, bold, background colour ('green', 'yellow', 'red'), text break after 50 letters, blank line after \n
+    *) Description block: left aligned, blank line after, text break after 50 letters \n
+    *) [X] block: yields symbol: ☑. Left aligned, text break after 48 letters, indentation adjusted for enumeration \n
+    *) [ ] block: yields symbol: ☐. Same as previous block
+    *) Note block: yields symbol: ⚠. Same as previous block
+
+    :param text: The raw text of the node. Use keywords 'Step:', 'Description', '[X]', '[ ]', 'Note', followed by a desired text.
+    :param title_colour: At the moment only 'green', 'yellow', 'red' supported.
+    :param text_width: The number of letters after which the text breaks.
+    :return: HTML formatted string
+    """
+    step_bg = TITLE_COLOURS.get(title_colour)
+    if step_bg is None:
+        print(f"Desired colour {title_colour} not yet supported for the title")
+        step_bg = TITLE_COLOURS["yellow"]
+
+    # Lengths of lines are integers, thus a width of e.g. 52.0 or 22.5 behaves like 52 or 22
+    text_width = int(text_width)
+
+    rows = []
+
+    # Each line is stripped since the keywords are flush-left. Blank lines are dropped.
+    for raw in prepare_text(text).splitlines():
+        raw = raw.strip()
+        if not raw:
+            continue
+
+        # 1) FORMATION FOR: STEP / TITLE ==========================================
+        if raw.startswith("Step:"):
+            for part in _wrap(_subst(raw), text_width):
+                rows.append(f'<TR><TD BGCOLOR="{step_bg}" ALIGN="CENTER"><B>{part}</B></TD></TR>')
+            rows.append(BLANK_ROW)  # blank after Step
+            continue
+
+        # FORMATION FOR: DESCRIPTION ==============================================
+        if raw.startswith("Description:"):
+            for part in _wrap(_subst(raw), text_width):
+                rows.append(f'<TR><TD ALIGN="LEFT"><I>{part}</I></TD></TR>')
+            rows.append(BLANK_ROW)  # blank after Description
+            continue
+
+        # FORMATION FOR: BULLET / WARNING =========================================
+        line = _subst(raw)
+        if line[0] in BULLETS:
+            # First line: bullet + single space + first chunk
+            wrapped = _wrap(line[1:].lstrip(), text_width-2)
+            rows.append(f'<TR><TD ALIGN="LEFT">{line[0]}&nbsp;{wrapped[0]}</TD></TR>')
+
+            # The '&#8203;&nbsp;&nbsp;&nbsp;&nbsp;' is for adding some whitespaces
+            for part in wrapped[1:]:
+                rows.append(f'<TR><TD ALIGN="LEFT">&#8203;&nbsp;&nbsp;&nbsp;&nbsp;{part}</TD></TR>')
+            continue
+
+        # FORMATION FOR: PLAIN TEXT ===============================================
+        for part in _wrap(line, text_width):
+            rows.append(f'<TR><TD ALIGN="LEFT">{part}</TD></TR>')
+
+    return '<<TABLE BORDER="0" CELLBORDER="0" CELLPADDING="0">' + "".join(rows) + "</TABLE>>"
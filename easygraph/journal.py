@@ -0,0 +1,222 @@
+"""
+For keeping an append-only journal of a Graph on disk, thus a crashed job does not lose the recorded graph (see
+Graph(journal=...) and Graph.replay()). The events are only queued by the recording thread. A background thread
+writes them as JSON lines, flushes and fsyncs the file periodically and starts a new segment file when the
+current one gets too big.
+
+The segments are named '<path>.1', '<path>.2', ... The first line of each segment is the header with the options
+of the graph. Each further line is an event:
+
+    ["c", name, text, supercluster]                  a cluster was added
+    ["t", label, text]                               a node label, referenced by its number
+    ["n", name, cluster, label, width, time_absolute, time_relative, connect, duration, memory_current, memory_peak]
+                                                     a node was added, with the id of its cluster (-1 for none)
+                                                     and the number of its label (-1 for none), NaN as null
+    ["e", src, dst]                                  an edge was added between the ids of two nodes
+    ["r", node, value(, weight)]                     a node was recorded again (aggregate=True) with the value, and
+                                                     the weight of a sampled call if it is not 1
+    ["s", node, state]                               the statistics of a merged node, see RunningStats.state()
+    ["m", node, top]                                 the top allocation sites of a node
+"""
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+
+VERSION = 1
+
+# Seconds the writer waits after the first queued event before writing, thus it writes in batches
+BATCH_DELAY = 0.05
+
+_CLOSE = object()
+
+
+def segments(path) -> list[str]:
+    """
+    :param path: The path of the journal
+    :return: The segment files of the journal, in the order they were written
+    """
+    path = os.fspath(path)
+    files = [(int(f[len(path) + 1:]), f) for f in glob.glob(glob.escape(path) + ".*") if f[len(path) + 1:].isdigit()]
+    return [f for _, f in sorted(files)]
+
+
+def _nan_to_none(value):
+    return None if isinstance(value, float) and value != value else value
+
+
+class Journal:
+    """
+    Append-only journal file with a background writer. append() never waits for the disk.
+
+        g = Graph(measure_time=True, journal=Journal("run.journal", fsync_interval=5.0))
+        ...
+        g = Graph.replay("run.journal")   # e.g. after a crash
+    """
+
+    def __init__(self, path, fsync_interval:float=1.0, max_bytes:int=64 * 2**20):
+        """
+        * fsync_interval: seconds between two fsyncs of the file, thus the events lost at most by a crash of
+          the machine. The events are written into the file (and thus survive a crash of the process) as soon
+          as the writer thread gets them.
+        * max_bytes: size after which a new segment file is started
+
+        """
+        self.path = os.fspath(path)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.header = None
+        self.errors: list[str] = []
+
+        self._segment = 0
+        self._queue = queue.SimpleQueue()
+        self._labels: dict[str, int] = {}
+        self._file = None
+        self._thread = None
+
+
+    def start(self, header:dict):
+        """
+        For creating the first segment and starting the writer thread. Called by the Graph.
+
+        :param header: The options of the graph, written as first line of each segment
+        :return: Nothing
+        """
+        if segments(self.path):
+            raise FileExistsError(f"The journal '{self.path}' exists already")
+        self.header = {"journal": "easygraph", "version": VERSION, **header}
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="easygraph-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def append(self, event:tuple):
+        """
+        For queueing an event. Called while recording, thus it only puts the event into the queue.
+
+        :param event: The event as tuple, see the module description
+        :return: Nothing
+        """
+        self._queue.put(event)
+
+
+    def _open_segment(self):
+        self._segment += 1
+        self._file = open(f"{self.path}.{self._segment}", "w", encoding="utf-8")
+        self._file.write(json.dumps(self.header) + "\n")
+        # The labels are numbered per segment, thus each segment can be read on its own
+        self._labels = {}
+
+
+    def _write(self, event:tuple):
+        write = self._file.write
+        if event[0] == "n":
+            text = event[3]
+            if text is None:
+                label = -1
+            else:
+                label = self._labels.get(text)
+                if label is None:
+                    label = self._labels[text] = len(self._labels)
+                    write(json.dumps(["t", label, text], ensure_ascii=False) + "\n")
+            event = event[:3] + (label,) + event[4:]
+        write(json.dumps([_nan_to_none(v) for v in event], ensure_ascii=False) + "\n")
+
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+    def _run(self):
+        """
+        The background writer: writes the queued events, fsyncs periodically and rotates the segments.
+        """
+        next_sync = time.monotonic() + self.fsync_interval
+        while True:
+            try:
+                event = self._queue.get(timeout=max(0.0, next_sync - time.monotonic()))
+            except queue.Empty:
+                event = None
+
+            try:
+                if event is _CLOSE:
+                    self._sync()
+                    self._file.close()
+                    return
+                if event is not None:
+                    # Waiting a moment lets the events accumulate, thus the writer takes the GIL from the
+                    # recording thread less often
+                    time.sleep(BATCH_DELAY)
+                    self._write(event)
+                    # Write everything which is queued already before flushing
+                    while True:
+                        try:
+                            event = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if event is _CLOSE:
+                            self._queue.put(_CLOSE)
+                            break
+                        self._write(event)
+                    self._file.flush()
+                    if self._file.tell() >= self.max_bytes:
+                        self._sync()
+                        self._file.close()
+                        self._open_segment()
+                if time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.fsync_interval
+            except OSError as e:
+                # The recording continues, but the problem is remembered
+                self.errors.append(str(e))
+
+
+    def close(self):
+        """
+        For writing all queued events, fsyncing and closing the journal. Called at exit automatically.
+
+        :return: Nothing
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        atexit.unregister(self.close)
+
+
+def read(path):
+    """
+    For reading the events of all segments of a journal. A line which was not written completely (crash while
+    writing) ends the segment.
+
+    :param path: The path of the journal
+    :return: Generator of (header, event) with the labels of the nodes resolved
+    """
+    for segment in segments(path):
+        with open(segment, encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                continue
+            if header.get("journal") != "easygraph":
+                raise ValueError(f"Not an easygraph journal: {segment}")
+            if header.get("version", 0) > VERSION:
+                raise ValueError(f"The journal has version {header['version']}, but only up to version {VERSION} "
+                                 f"is supported")
+            labels = {}
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if event[0] == "t":
+                    labels[event[1]] = event[2]
+                    continue
+                if event[0] == "n":
+                    event[3] = labels[event[3]] if event[3] >= 0 else None
+                yield header, event
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import threading
+
+
+class LabelCache:
+    """
+    A bounded LRU cache for the finished HTML labels of the nodes. The same step text is often rendered
+    many times (loops, repeated runs), thus the whole formatting pipeline only needs to run once per
+    distinct (text, title_colour, width). Can be used from several threads.
+    """
+
+    def __init__(self, maxsize:int=4096):
+        """
+        * The maxsize defines how many labels are kept. The least recently used label is dropped first.
+          With maxsize=0 the cache is disabled.
+
+        """
+        self._labels = OrderedDict()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+
+    def get(self, key):
+        """
+        For looking up a label and marking it as recently used.
+
+        :param key: The tuple (text, title_colour, width)
+        :return: The cached HTML label or None if not cached
+        """
+        with self._lock:
+            label = self._labels.get(key)
+            if label is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._labels.move_to_end(key)
+            return label
+
+
+    def put(self, key, label:str):
+        """
+        For storing a label. If the cache is full, then the least recently used label is dropped.
+
+        :param key: The tuple (text, title_colour, width)
+        :param label: The finished HTML label
+        :return: Nothing
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._labels[key] = label
+            self._labels.move_to_end(key)
+            while len(self._labels) > self.maxsize:
+                self._labels.popitem(last=False)
+
+
+    def resize(self, maxsize:int):
+        """
+        For changing the size of the cache. Drops the least recently used labels if it shrinks.
+
+        :param maxsize: The new maximal number of labels
+        :return: Nothing
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._labels) > max(maxsize, 0):
+                self._labels.popitem(last=False)
+
+
+    def clear(self):
+        """
+        For removing all labels and resetting the hit and miss counters.
+
+        :return: Nothing
+        """
+        with self._lock:
+            self._labels.clear()
+            self.hits = 0
+            self.misses = 0
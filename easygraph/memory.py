@@ -0,0 +1,136 @@
+"""
+For measuring the memory allocated per node with tracemalloc (see Graph(measure_memory=True)).
+"""
+import fnmatch
+import os
+import tracemalloc
+
+
+# Allocations of tracemalloc itself and of easygraph are not part of the top allocation sites
+_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, os.path.join(os.path.dirname(__file__), "*")),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"))
+
+
+class _Mark:
+    """
+    A start point of MemoryTracker: the allocated memory and the snapshot at the start, and the highest peak
+    seen since the start.
+    """
+    __slots__ = ("current", "snapshot", "peak")
+
+    def __init__(self, current:int, snapshot):
+        self.current = current
+        self.snapshot = snapshot
+        self.peak = current
+
+
+class MemoryTracker:
+    """
+    Measures the traced memory between two points: the change of the currently allocated memory and the peak
+    above the start. Optionally, also the top allocation sites (file and line) are compared between snapshots.
+
+    * The peak of tracemalloc is reset at each start point. Before that, the peak so far is kept by all open
+      measurements, thus nested measurements (e.g. nested steps or add_node() inside a step) do not hide the
+      peak of the enclosing ones.
+
+    """
+
+    def __init__(self, top:int=0):
+        """
+        * top: number of allocation sites kept per node, 0 for none. Taking the snapshots is slow.
+
+        """
+        self.top = top
+        # The marks which are not finished by since() yet
+        self._open = []
+        self._previous = None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if top > 0:
+            # The patterns of the filters are compiled (and cached) once, which would appear as allocations
+            # of the first node
+            for f in _FILTERS:
+                fnmatch.fnmatch("", f.filename_pattern)
+        self._previous = self._mark()
+
+
+    def _reset_peak(self):
+        """
+        For resetting the peak of tracemalloc, after keeping it in the open marks and the previous measure() point.
+
+        :return: Nothing
+        """
+        peak = tracemalloc.get_traced_memory()[1]
+        for mark in self._open:
+            if peak > mark.peak:
+                mark.peak = peak
+        if self._previous is not None and peak > self._previous.peak:
+            self._previous.peak = peak
+        tracemalloc.reset_peak()
+
+
+    def _mark(self) -> _Mark:
+        self._reset_peak()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS) if self.top > 0 else None
+        return _Mark(tracemalloc.get_traced_memory()[0], snapshot)
+
+
+    def mark(self) -> _Mark:
+        """
+        :return: A start point for since(), open until since() is called with it
+        """
+        mark = self._mark()
+        self._open.append(mark)
+        return mark
+
+
+    def since(self, start:_Mark) -> tuple:
+        """
+        :param start: The start point of mark()
+        :return: (change of the allocated memory in bytes, peak above the start in bytes, top allocation sites
+                 as list of dicts with 'file', 'line', 'size' and 'count' (changes), or None)
+        """
+        # Usually the innermost mark, thus searched from the end
+        for k in range(len(self._open) - 1, -1, -1):
+            if self._open[k] is start:
+                del self._open[k]
+                break
+        return self._since(start)[0]
+
+
+    def _since(self, start:_Mark) -> tuple:
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, start.peak)
+        snapshot, top = None, None
+        if start.snapshot is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+            top = [{"file": stat.traceback[0].filename,
+                    "line": stat.traceback[0].lineno,
+                    "size": stat.size_diff,
+                    "count": stat.count_diff}
+                   for stat in snapshot.compare_to(start.snapshot, "lineno")[:self.top] if stat.size_diff or stat.count_diff]
+        return (current - start.current, peak - start.current, top), _Mark(current, snapshot)
+
+
+    def measure(self) -> tuple:
+        """
+        For measuring since the previous call (or the creation of the tracker), e.g. between two add_node().
+
+        :return: See since()
+        """
+        result, previous = self._since(self._previous)
+        self._previous = None
+        self._reset_peak()
+        self._previous = previous
+        return result
+
+
+    def __getstate__(self):
+        # Snapshots are not pickled. After unpickling, the next measurement starts from the current memory.
+        return {"top": self.top}
+
+
+    def __setstate__(self, state):
+        self.__init__(state["top"])
@@ -0,0 +1,200 @@
+"""
+The graph used when recording is disabled (Graph(enabled=False), Graph.enabled = False or the environment variable
+EASYGRAPH_DISABLED=1). All methods of Graph are accepted and do nothing: no formatting, no timing, no storing.
+Thus, the calls can stay in production code.
+"""
+from types import MappingProxyType
+
+
+_EMPTY = MappingProxyType({})
+
+
+class _NullContext:
+    """
+    Context manager doing nothing, for step() and record_calls().
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+    def start(self):
+        pass
+
+
+    def stop(self):
+        pass
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class _NullDot:
+    """
+    The dot of the NullGraph: the methods of graphviz.Digraph used to set it up, e.g. g.dot.attr(rankdir="LR"),
+    doing nothing.
+    """
+    __slots__ = ()
+
+    source = ""
+
+    def attr(self, *args, **kwargs):
+        pass
+
+
+    def node(self, *args, **kwargs):
+        pass
+
+
+    def edge(self, *args, **kwargs):
+        pass
+
+
+    def edges(self, *args, **kwargs):
+        pass
+
+
+    def subgraph(self, *args, **kwargs):
+        # Same as Digraph.subgraph(name=...), also usable as 'with g.dot.subgraph(name=...) as c:'
+        return self
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+    def render(self, *args, **kwargs):
+        return None
+
+
+    def save(self, *args, **kwargs):
+        return None
+
+
+_NULL_DOT = _NullDot()
+
+
+def _unchanged(func):
+    return func
+
+
+class NullGraph:
+    """
+    Same methods as Graph, all of them doing nothing. There is only one instance, NULL_GRAPH.
+
+    * Decorators of timed() return the function unchanged, thus decorated functions have no overhead at all.
+    * step() and record_calls() return one shared context manager.
+    * dot accepts attr(), node(), edge() and subgraph() (also as context manager) and ignores them.
+
+    """
+    __slots__ = ()
+
+    enabled = False
+    measure_time = False
+    measure_memory = False
+    aggregate = False
+    journal = None
+    sampling = None
+    dot = _NULL_DOT
+    nodes = _EMPTY
+    clusters = _EMPTY
+    node_previous_auto = None
+    time_node_previous = None
+
+    def __repr__(self):
+        return "NullGraph()"
+
+
+    def __reduce__(self):
+        # Unpickled as the same instance
+        return "NULL_GRAPH"
+
+
+    def add_global(self, name:str):
+        # Registered once, thus Graph.globals[name] also works while disabled
+        from .directed_graph import Graph
+        Graph.globals[name] = self
+
+
+    def add_cluster(self, name:str=None, text:str="", supercluster:str=None):
+        pass
+
+
+    def add_node(self, name:str, **kwargs):
+        pass
+
+
+    def add_clusters(self, clusters):
+        pass
+
+
+    def add_nodes(self, nodes):
+        pass
+
+
+    def step(self, name:str, **kwargs) -> _NullContext:
+        return _NULL_CONTEXT
+
+
+    def timed(self, name:str|None=None, **kwargs):
+        return _unchanged
+
+
+    def record_calls(self, *args, **kwargs) -> _NullContext:
+        return _NULL_CONTEXT
+
+
+    def successors(self, name:str) -> list:
+        return []
+
+
+    def predecessors(self, name:str) -> list:
+        return []
+
+
+    def ancestors(self, name:str) -> set:
+        return set()
+
+
+    def descendants(self, name:str) -> set:
+        return set()
+
+
+    def topological_order(self) -> list:
+        return []
+
+
+    def create(self, *args, **kwargs):
+        pass
+
+
+    def merge(self, other, under_cluster:str|None=None):
+        pass
+
+
+    def write_dot(self, file):
+        pass
+
+
+    def dump(self, path):
+        pass
+
+
+    def save(self, name, *args, **kwargs):
+        return None
+
+
+    async def asave(self, name, *args, **kwargs):
+        return None
+
+
+NULL_GRAPH = NullGraph()
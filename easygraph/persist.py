@@ -0,0 +1,203 @@
+"""
+For saving the model of a Graph (clusters, nodes, edges, times, statistics) into a file and loading it again,
+e.g. for comparing runs or rendering later. Does not need graphviz.
+
+The file (gzip compressed if the name ends with '.gz') starts with the line b"EASYGRAPH\\n" and a JSON line with
+the format version, the byte order and the options of the graph. Then records follow, each of them a kind (one
+byte), the number of parts and each part with its length and content:
+
+    C  clusters: JSON list of [name, text, supercluster]
+    T  node labels: the number of labels and the labels joined by NUL, appended to the table of labels
+    N  nodes (in chunks): the number of nodes, the names joined by NUL, the position of the label in the table
+       (-1 for none) and the further columns of NodeStore as raw arrays
+    E  edges (in chunks): the columns edge_src, edge_dst, edge_next as raw arrays
+    S  statistics: JSON list of [node, count, measured, total, min, max, p50 markers, p95 markers]
+    M  top allocation sites: JSON list of [node, top]
+
+Thus, the file is read record by record and the columns are copied as a whole.
+"""
+from array import array
+import gzip
+import json
+import struct
+import sys
+
+from .stats import RunningStats
+
+
+MAGIC = b"EASYGRAPH\n"
+VERSION = 1
+
+# Number of nodes or edges per record
+CHUNK = 65536
+
+# The columns of the nodes in a record of kind N, after the names and labels
+_NODE_COLUMNS = ("cluster", "width", "time_absolute", "time_relative", "connect", "duration",
+                 "memory_current", "memory_peak", "in_first", "in_last")
+_EDGE_COLUMNS = ("edge_src", "edge_dst", "edge_next")
+
+_LENGTH = struct.Struct("<Q")
+
+
+def _open(path, mode:str):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "b", compresslevel=6)
+    return open(path, mode + "b")
+
+
+def _write_record(f, kind:bytes, parts:list[bytes]):
+    f.write(kind + _LENGTH.pack(len(parts)))
+    for part in parts:
+        f.write(_LENGTH.pack(len(part)))
+        f.write(part)
+
+
+def _read_exactly(f, size:int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("The easygraph file is truncated")
+    return data
+
+
+def _read_record(f) -> tuple[bytes, list[bytes]]|None:
+    kind = f.read(1)
+    if not kind:
+        return None
+    count = _LENGTH.unpack(_read_exactly(f, 8))[0]
+    return kind, [_read_exactly(f, _LENGTH.unpack(_read_exactly(f, 8))[0]) for _ in range(count)]
+
+
+def _join(strings) -> bytes:
+    strings = list(strings)
+    if any("\0" in s for s in strings):
+        raise ValueError("Names and labels containing NUL can not be saved")
+    return "\0".join(strings).encode("utf-8")
+
+
+def _split(data:bytes, count:int) -> list[str]:
+    return data.decode("utf-8").split("\0") if count else []
+
+
+def dump(graph, path):
+    """
+    For writing the model of the graph into a file.
+
+    :param graph: The easygraph Graph object
+    :param path: The path of the file, compressed with gzip if it ends with '.gz'
+    :return: Nothing
+    """
+    nodes, clusters = graph._nodes, graph._clusters
+    header = {"version": VERSION,
+              "byteorder": sys.byteorder,
+              "measure_time": graph.measure_time,
+              "time_start": getattr(graph, "time_start", None),
+              "levels": graph.levels,
+              "aggregate": graph.aggregate,
+              "measure_memory": graph.measure_memory,
+              "colour_by_memory": graph.colour_by_memory,
+              "previous": graph.node_previous_auto}
+
+    with _open(path, "w") as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+
+        # 1) The clusters, in the order they were added
+        if len(clusters):
+            _write_record(f, b"C", [json.dumps(list(zip(clusters.names, clusters.text, clusters.supercluster)),
+                                               ensure_ascii=False).encode("utf-8")])
+
+        # 2) The nodes in chunks. Each distinct label is only written once, before the first chunk using it.
+        labels = {}
+        for a in range(0, len(nodes), CHUNK):
+            b = min(a + CHUNK, len(nodes))
+            new, ids = [], array('i')
+            for text in nodes.text[a:b]:
+                if text is None:
+                    ids.append(-1)
+                    continue
+                k = labels.get(text)
+                if k is None:
+                    k = labels[text] = len(labels)
+                    new.append(text)
+                ids.append(k)
+            if new:
+                _write_record(f, b"T", [_LENGTH.pack(len(new)), _join(new)])
+            _write_record(f, b"N", [_LENGTH.pack(b - a), _join(nodes.names[a:b]), ids.tobytes()]
+                                   + [getattr(nodes, column)[a:b].tobytes() for column in _NODE_COLUMNS])
+
+        # 3) The edges in chunks, with their chaining into the nodes
+        for a in range(0, len(nodes.edge_src), CHUNK):
+            b = a + CHUNK
+            _write_record(f, b"E", [getattr(nodes, column)[a:b].tobytes() for column in _EDGE_COLUMNS])
+
+        # 4) Statistics and allocation sites
+        if graph._stats:
+            _write_record(f, b"S", [json.dumps([[i] + s.state() for i, s in graph._stats.items()]).encode("utf-8")])
+        if graph._memory_top:
+            _write_record(f, b"M", [json.dumps(list(graph._memory_top.items())).encode("utf-8")])
+
+
+def read_header(f) -> dict:
+    """
+    :param f: The opened file
+    :return: The header of the file
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not an easygraph file")
+    header = json.loads(f.readline())
+    if header.get("version", 0) > VERSION:
+        raise ValueError(f"The file has version {header['version']}, but only up to version {VERSION} is supported")
+    return header
+
+
+def load_into(graph, f, header:dict):
+    """
+    For reading the clusters, nodes and edges of the file (after the header) record by record into an empty
+    graph. The columns are appended as a whole, thus without the checks and formatting of add_node().
+
+    :param graph: The new, empty Graph object
+    :param f: The opened file, after read_header()
+    :param header: The header of the file
+    :return: Nothing
+    """
+    nodes = graph._nodes
+    swap = header["byteorder"] != sys.byteorder
+    labels = []
+
+    def values(typecode:str, data:bytes) -> array:
+        result = array(typecode)
+        result.frombytes(data)
+        if swap:
+            result.byteswap()
+        return result
+
+    while (record := _read_record(f)) is not None:
+        kind, parts = record
+        if kind == b"N":
+            count = _LENGTH.unpack(parts[0])[0]
+            names = _split(parts[1], count)
+            n0 = len(nodes.names)
+            nodes.ids.update(zip(names, range(n0, n0 + count)))
+            nodes.names.extend(names)
+            nodes.text.extend([labels[k] if k >= 0 else None for k in values('i', parts[2])])
+            for column, data in zip(_NODE_COLUMNS, parts[3:]):
+                getattr(nodes, column).extend(values(getattr(nodes, column).typecode, data))
+            graph._new_nodes.extend(range(n0, n0 + count))
+        elif kind == b"E":
+            for column, data in zip(_EDGE_COLUMNS, parts):
+                getattr(nodes, column).extend(values(getattr(nodes, column).typecode, data))
+        elif kind == b"T":
+            labels.extend(_split(parts[1], _LENGTH.unpack(parts[0])[0]))
+        elif kind == b"C":
+            for name, text, sup in json.loads(parts[0]):
+                graph.add_cluster(name, text=text, supercluster=sup)
+        elif kind == b"S":
+            for i, *state in json.loads(parts[0]):
+                graph._stats[i] = RunningStats.from_state(state)
+        elif kind == b"M":
+            graph._memory_top.update((i, top) for i, top in json.loads(parts[0]))
+        else:
+            raise ValueError(f"Unknown record {kind!r} in the easygraph file")
+
+    # The chains of the outgoing edges are not in the file, since they follow from the edges
+    nodes.index_successors()
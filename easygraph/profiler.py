@@ -0,0 +1,232 @@
+"""
+For recording the function calls of selected modules as nodes of a Graph, thus without placing add_node() by hand.
+The calls are caught with sys.setprofile(). While recording, only the number of calls, the cumulative time and
+the caller->callee pairs of each function are counted. The nodes, edges and clusters are added to the graph when
+the recording stops.
+"""
+import sys
+import threading
+import time
+
+
+_MISSING = object()
+
+
+class _ThreadState:
+    """
+    The recorded calls of one thread.
+
+    * stack: for each running frame (key or None if not recorded, start in ns, recorded depth, key of the
+      nearest recorded caller)
+    * calls: key -> [count, cumulative time in ns, start of the first call in ns, number of running calls]
+    * edges: (key of caller, key of callee) -> count
+    """
+    __slots__ = ("stack", "calls", "edges")
+
+    def __init__(self):
+        self.stack = []
+        self.calls = {}
+        self.edges = {}
+
+
+class CallRecorder:
+    """
+    Records the calls of functions as nodes, nested into clusters following the package, module and class
+    of the function. The edges go from the caller to the callee and are labeled with the cumulative time of
+    the callee. Use it as context manager or with start() and stop():
+
+        with CallRecorder(g, include=["mypackage"], max_depth=6, min_duration=1e-3):
+            mypackage.main()
+        g.create()
+        g.save("examples/calls")
+    """
+
+    def __init__(self, graph, include=None, exclude=(), max_depth:int|None=None, min_duration:float=0.0,
+                 threads:bool=False):
+        """
+        * include: names of modules or packages (e.g. ['mypackage', 'other.module']) whose functions are
+          recorded. None records all modules, which slows the program down a lot.
+        * exclude: names of modules or packages which are not recorded, even if included
+        * max_depth: maximal number of nested recorded calls. Deeper calls are not recorded.
+        * min_duration: functions with a cumulative time less than this (in seconds) are left out of the graph
+        * threads: if True, also threads started while recording are recorded
+
+        """
+        self.graph = graph
+        self.include = tuple(include) if include is not None else None
+        self.exclude = tuple(exclude) + (__package__,)
+        self.max_depth = max_depth
+        self.min_duration = min_duration
+        self.threads = threads
+
+        # code object -> key of the function, or None if not recorded. The key is the name of the node.
+        self._keys = {}
+        # key -> (module, qualified name)
+        self._names = {}
+        self._states: list[_ThreadState] = []
+        self._lock = threading.Lock()
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+    @staticmethod
+    def _matches(module:str, names:tuple) -> bool:
+        return any(module == name or module.startswith(name + ".") for name in names)
+
+
+    def _key_of(self, frame) -> str|None:
+        """
+        For deciding once per function if it is recorded.
+
+        :return: The key (name of the node) of the function, or None if not recorded
+        """
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "")
+        key = None
+        if ((self.include is None or self._matches(module, self.include))
+                and not self._matches(module, self.exclude)):
+            qualname = getattr(code, "co_qualname", code.co_name)
+            key = f"{module}.{qualname}"
+            self._names[key] = (module, qualname)
+        self._keys[code] = key
+        return key
+
+
+    def _profiler(self):
+        """
+        :return: A new profile function for the current thread, see sys.setprofile()
+        """
+        state = _ThreadState()
+        with self._lock:
+            self._states.append(state)
+        stack, calls, edges = state.stack, state.calls, state.edges
+        keys, key_of, max_depth = self._keys, self._key_of, self.max_depth
+        now = time.perf_counter_ns
+
+        def profile(frame, event, arg):
+            if event == "call":
+                key = keys.get(frame.f_code, _MISSING)
+                if key is _MISSING:
+                    key = key_of(frame)
+                depth, caller = (stack[-1][2], stack[-1][3]) if stack else (0, None)
+                if key is None or (max_depth is not None and depth >= max_depth):
+                    stack.append((None, 0, depth, caller))
+                    return
+                start = now()
+                c = calls.get(key)
+                if c is None:
+                    c = calls[key] = [0, 0, start, 0]
+                c[0] += 1
+                c[3] += 1
+                if caller is not None:
+                    edges[(caller, key)] = edges.get((caller, key), 0) + 1
+                stack.append((key, start, depth + 1, key))
+            elif event == "return" and stack:
+                key, start, _, _ = stack.pop()
+                if key is not None:
+                    c = calls[key]
+                    c[3] -= 1
+                    # Recursive calls are only counted once in the cumulative time
+                    if not c[3]:
+                        c[1] += now() - start
+
+        return profile
+
+
+    def _start_thread(self, frame, event, arg):
+        # Called once in each new thread, then replaced by the profile function of the thread
+        profile = self._profiler()
+        sys.setprofile(profile)
+        profile(frame, event, arg)
+
+
+    def start(self):
+        """
+        For starting the recording in the current thread (and new threads if threads=True).
+
+        :return: Nothing
+        """
+        # Profilers installed before (e.g. cProfile) are installed again by stop()
+        self._saved_profiles = (sys.getprofile(), threading.getprofile())
+        if self.threads:
+            threading.setprofile(self._start_thread)
+        sys.setprofile(self._profiler())
+
+
+    def stop(self):
+        """
+        For stopping the recording and adding the recorded functions to the graph. Threads which are still
+        running are not stopped and thus should be finished before.
+
+        :return: Nothing
+        """
+        profile, thread_profile = self._saved_profiles
+        if profile is not None and not callable(profile) and hasattr(profile, "enable"):
+            # Profilers implemented in C (cProfile.Profile) are only installed again by themselves
+            profile.enable()
+        else:
+            sys.setprofile(profile)
+        if self.threads:
+            threading.setprofile(thread_profile)
+
+        with self._lock:
+            states, self._states = self._states, []
+        self._add_to_graph(states)
+
+
+    def _add_to_graph(self, states:list[_ThreadState]):
+        """
+        For adding the recorded calls of all threads to the graph with add_clusters() and add_nodes().
+
+        :return: Nothing
+        """
+        graph = self.graph
+
+        # 1) Sum up the threads, in the order the functions were called first
+        calls, edges = {}, {}
+        for state in states:
+            for key, (count, total, first, _) in state.calls.items():
+                c = calls.setdefault(key, [0, 0, first])
+                c[0] += count
+                c[1] += total
+                c[2] = min(c[2], first)
+            for pair, count in state.edges.items():
+                edges[pair] = edges.get(pair, 0) + count
+        kept = [key for key, (_, total, _) in calls.items() if total >= self.min_duration * 1e9]
+        kept_set = set(kept)
+
+        callers = {}
+        for (caller, callee) in edges:
+            if caller in kept_set and callee in kept_set:
+                callers.setdefault(callee, []).append(caller)
+
+        # 2) The clusters: packages, modules and classes (e.g. 'pkg', 'pkg.mod', 'pkg.mod.Class')
+        clusters, cluster_of = {}, {}
+        for key in kept:
+            module, qualname = self._names[key]
+            path = module.split(".") + [part for part in qualname.split(".")[:-1] if part != "<locals>"]
+            supercluster = None
+            for i in range(1, len(path) + 1):
+                name = ".".join(path[:i])
+                if name not in clusters and name not in graph.clusters:
+                    clusters[name] = (name, "", supercluster)
+                supercluster = name
+            cluster_of[key] = supercluster
+        graph.add_clusters(clusters.values())
+
+        # 3) The nodes with the callers as previous nodes. The cumulative time is stored as the relative time.
+        rows = []
+        for key in kept:
+            count, total, first = calls[key]
+            qualname = self._names[key][1]
+            rows.append((key, callers.get(key), f"Step: {qualname}\nCalls: {count}", cluster_of[key], "yellow", 1,
+                         (first - graph._time_start_ns) / 1e9, total / 1e9))
+        graph.add_nodes(rows)
@@ -0,0 +1,220 @@
+"""
+For rendering graphs into several formats at once. The DOT source of each graph is written only once and the
+layout subprocesses ('dot') of all files run in parallel in a thread pool. Also, for rendering without
+blocking an asyncio event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import subprocess
+import time
+import weakref
+
+import graphviz
+
+from .dot_writer import partition_names, write_partitions
+
+# The maximal number of layout subprocesses started by arender() at once, per event loop
+RENDER_LIMIT = os.cpu_count() or 4
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _write_source(graph, name:str, backend:str):
+    """
+    For writing the DOT source of the graph into the file 'name', same as Digraph.render() does.
+
+    :param graph: The easygraph Graph object
+    :param name: name of the file
+    :param backend: 'digraph' (source of the Digraph object of create()) or 'stream' (see Graph.write_dot())
+    :return: Nothing
+    """
+    if backend == "stream":
+        graph.write_dot(name)
+    else:
+        with graph._lock:
+            graph.dot.save(name)
+
+
+def _render_file(name:str, format:str, cache=None, source:str|None=None) -> dict:
+    """
+    For rendering one file from an already written source. Errors are returned instead of raised, thus
+    one failing file does not stop the others.
+
+    :param name: name of the source file
+    :param format: the format of the image, e.g. 'svg', 'png' or 'pdf'
+    :param cache: A RenderCache or None
+    :param source: The content of the source file, required if a cache is given
+    :return: dict with 'file', 'format', 'seconds', 'cached' and 'error' (None if successful)
+    """
+    start = time.perf_counter()
+    file = f"{name}.{format}"
+    error = None
+    cached = False
+    try:
+        if cache is not None:
+            key = cache.key(source, format, engine="dot")
+            cached = cache.fetch(key, format, file)
+        if not cached:
+            # The previous image may be a hard link to a cached image (RenderCache(link=True)), which rendering
+            # into the same file would overwrite
+            if cache is not None and os.path.exists(file):
+                os.remove(file)
+            graphviz.render("dot", format, name)
+            if cache is not None:
+                cache.store(key, format, file)
+    except (graphviz.ExecutableNotFound, subprocess.CalledProcessError, OSError, ValueError) as e:
+        error = str(e)
+    return {"file": file,
+            "format": format,
+            "seconds": time.perf_counter() - start,
+            "cached": cached,
+            "error": error}
+
+
+def render_many(graphs, formats=("svg",), max_workers:int|None=None, backend:str="digraph",
+                cache=None) -> list[dict]:
+    """
+    For rendering several graphs into several formats in parallel. The images are the same as rendering
+    each graph and format one after the other with Graph.save().
+
+        results = render_many({"overview": g1, "details": g2}, formats=["svg", "png", "pdf"])
+
+    :param graphs: Either a mapping from file name to Graph object or an iterable of (name, Graph) tuples.
+                   With backend='digraph' create() needs to be called before.
+    :param formats: The formats of the images, e.g. ['svg', 'png', 'pdf']
+    :param max_workers: The number of layout subprocesses running at once (default of ThreadPoolExecutor)
+    :param backend: 'digraph' or 'stream', see Graph.save()
+    :param cache: A RenderCache, thus images of unchanged sources are copied from the cache instead of rendered
+    :return: For each graph and format (in this order) a dict with 'file', 'format', 'seconds', 'cached' and 'error'
+    """
+    if backend not in ("digraph", "stream"):
+        print(f"Error: Backend '{backend}' is not supported! Use 'digraph' or 'stream'.")
+        return []
+
+    graphs = list(graphs.items() if hasattr(graphs, "items") else graphs)
+    formats = [formats] if isinstance(formats, str) else list(formats)
+
+    # 1) The source of each graph is written once and used for all its formats
+    written = []
+    try:
+        for name, graph in graphs:
+            _write_source(graph, name, backend)
+            written.append(name)
+
+        # 2) The layout subprocesses of all files at once
+        return _render_sources(written, formats, max_workers, cache)
+    finally:
+        for name in written:
+            os.remove(name)
+
+
+def _render_sources(names:list[str], formats:list[str], max_workers:int|None, cache) -> list[dict]:
+    """
+    For rendering written source files into all formats in a thread pool.
+
+    :return: For each source file and format (in this order) a dict, see _render_file()
+    """
+    sources = {}
+    if cache is not None:
+        for name in names:
+            with open(name, encoding="utf-8") as f:
+                sources[name] = f.read()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_render_file, name, format, cache, sources.get(name))
+                   for name in names for format in formats]
+        return [future.result() for future in futures]
+
+
+def render_partitions(graph, name:str, formats=("svg",), max_workers:int|None=None, cache=None) -> list[dict]:
+    """
+    For rendering each top-level cluster of the graph into its own file and an overview of all of them, thus
+    many small layouts in parallel instead of one big layout (see Graph.save(partition='cluster')).
+
+    * The overview 'name' shows the top-level clusters as summary nodes (see Graph.create(max_depth=0)) and the
+      nodes without cluster. Each summary node links to the file of its cluster.
+    * The file of a cluster is named 'name_<cluster>'. The nodes of other partitions connected to it are shown
+      as dashed stub nodes, which link to the file of their partition.
+    * The links point to the files of the first format, thus use e.g. 'svg' first to get clickable images.
+
+    :param graph: The easygraph Graph object, create() is not required
+    :param name: The name of the overview file
+    :param formats: The formats of the images, e.g. ['svg', 'png']
+    :param max_workers: The number of layout subprocesses running at once (default of ThreadPoolExecutor)
+    :param cache: A RenderCache or None
+    :return: For the overview and each partition (in this order) and each format a dict with 'file', 'format',
+             'seconds', 'cached' and 'error'
+    """
+    formats = [formats] if isinstance(formats, str) else list(formats)
+
+    # 1) All sources are written while holding the lock, thus they show the same state of the graph
+    written = []
+    try:
+        with graph._lock:
+            graph._flush_steps()
+            files = partition_names(graph, name)
+            links = {top: f"{os.path.basename(file)}.{formats[0]}" for top, file in files.items()}
+            graph._collapsed_dot(None, 0, (), links=links).save(name)
+            written.append(name)
+            write_partitions(graph, files, links={**links, None: f"{os.path.basename(name)}.{formats[0]}"})
+            written.extend(files.values())
+
+        # 2) The layout subprocesses of all files at once
+        return _render_sources(written, formats, max_workers, cache)
+    finally:
+        for file in written:
+            if os.path.exists(file):
+                os.remove(file)
+
+
+def _semaphore() -> asyncio.BoundedSemaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.BoundedSemaphore(RENDER_LIMIT)
+    return semaphore
+
+
+async def arender(source:str, name:str, format:str='svg', timeout:float|None=None, engine:str="dot") -> str:
+    """
+    For rendering a DOT source into the file 'name.format' without blocking the event loop. The source is
+    piped into the layout subprocess, thus no source file is written. At most RENDER_LIMIT subprocesses run
+    at once per event loop, further calls wait.
+
+    * If the timeout is exceeded or the calling task is cancelled, then the subprocess is killed and no
+      image is left behind.
+
+    :param source: The DOT source
+    :param name: name of the file
+    :param format: the format of the image, e.g. 'svg', 'png' or 'pdf'
+    :param timeout: Seconds after which the rendering is stopped with a TimeoutError, None for no limit
+    :param engine: The layout engine
+    :return: The path of the image
+    """
+    file = f"{name}.{format}"
+    cmd = [engine, f"-K{engine}", f"-T{format}", "-o", file]
+
+    async with _semaphore():
+        try:
+            process = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError as e:
+            raise graphviz.ExecutableNotFound(cmd) from e
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(source.encode("utf-8")), timeout)
+        except BaseException:
+            # Timeout or cancelled: stop the subprocess and remove the partial image
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+            if os.path.exists(file):
+                os.remove(file)
+            raise
+
+    if process.returncode:
+        if os.path.exists(file):
+            os.remove(file)
+        raise graphviz.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+    return file
@@ -0,0 +1,183 @@
+"""
+For skipping the rendering of graphs which did not change. The rendered images are kept in a local directory,
+addressed by the hash of the DOT source, the format and the layout engine.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+
+# The measured values, which change on every run: the labels of the edges (times, statistics of repeated or
+# sampled nodes and memory, see dot_writer.edge_label()), the rows of statistics in the nodes
+# (dot_writer.node_label()) and the total time of collapsed clusters (dot_writer.summary_label())
+_MEASURED = re.compile(r'label="(?:Δt=|n=|n≈|mem=)[^"]*"'
+                       r'|<FONT POINT-SIZE="10">[^<]*</FONT>'
+                       r'|>Σt=[^<]*<')
+
+# The names of the cached images, '<sha256>.<format>'. Other files in the directory are never touched.
+_ENTRY = re.compile(r"[0-9a-f]{64}\.[^.]+")
+
+
+def _default_directory() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "easygraph")
+
+
+class RenderCache:
+    """
+    A cache for rendered images on disk. If the same DOT source was already rendered into the same format,
+    the cached image is copied (or linked) instead of running graphviz again. Can be used from several threads.
+
+        cache = RenderCache(ignore_time_labels=True)
+        g.create()
+        g.save("examples/basic_test", cache=cache)
+    """
+
+    def __init__(self, directory:str|None=None, max_bytes:int=256 * 2**20, ignore_time_labels:bool=False,
+                 link:bool=False):
+        """
+        * The directory defaults to $XDG_CACHE_HOME/easygraph or ~/.cache/easygraph.
+        * If the cached images take more than max_bytes, then the least recently used images are removed.
+        * With ignore_time_labels=True the measured values are not part of the hash: the labels of the edges
+          (times, statistics, memory), the statistics in the nodes and the total time of collapsed clusters.
+          Thus, a graph is not rendered again if only the measurements changed, but the image shows the
+          measurements of the run which was rendered.
+        * With link=True the image is hard linked to the cached file if possible, instead of copied. Then,
+          changing the image also changes the cached file.
+
+        """
+        self.directory = directory if directory is not None else _default_directory()
+        self.max_bytes = max_bytes
+        self.ignore_time_labels = ignore_time_labels
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def key(self, source:str, format:str, engine:str="dot") -> str:
+        """
+        :param source: The DOT source
+        :param format: The format of the image, e.g. 'svg'
+        :param engine: The layout engine, e.g. 'dot'
+        :return: The hash of the source, format and engine
+        """
+        if self.ignore_time_labels:
+            source = _MEASURED.sub("measured", source)
+        h = hashlib.sha256()
+        h.update(f"{engine}\0{format}\0".encode("utf-8"))
+        h.update(source.encode("utf-8"))
+        return h.hexdigest()
+
+
+    def _path(self, key:str, format:str) -> str:
+        return os.path.join(self.directory, f"{key}.{format}")
+
+
+    def fetch(self, key:str, format:str, file:str) -> bool:
+        """
+        For copying the cached image into 'file', if it exists.
+
+        :param key: The key of the image, see key()
+        :param format: The format of the image
+        :param file: The path of the image to create
+        :return: True if the image was cached
+        """
+        path = self._path(key, format)
+        try:
+            # Mark as recently used for the eviction
+            os.utime(path)
+            if os.path.exists(file):
+                os.remove(file)
+            if not self.link or not self._hard_link(path, file):
+                shutil.copyfile(path, file)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+
+    @staticmethod
+    def _hard_link(path:str, file:str) -> bool:
+        try:
+            os.link(path, file)
+            return True
+        except OSError:
+            return False
+
+
+    def store(self, key:str, format:str, file:str):
+        """
+        For putting a rendered image into the cache. Afterwards, the least recently used images are removed
+        until the cache is not bigger than max_bytes.
+
+        :param key: The key of the image, see key()
+        :param format: The format of the image
+        :param file: The path of the rendered image
+        :return: Nothing
+        """
+        # Written into a temporary file first, thus other processes never see a partial image
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(file, tmp)
+            os.replace(tmp, self._path(key, format))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+
+    def _entries(self) -> list:
+        """
+        :return: The os.DirEntry objects of the cached images in the directory
+        """
+        return [entry for entry in os.scandir(self.directory) if _ENTRY.fullmatch(entry.name) and entry.is_file()]
+
+
+    def evict(self):
+        """
+        For removing the least recently used images until the cache is not bigger than max_bytes. Only the cached
+        images count and are removed, not other files in the directory.
+
+        :return: Nothing
+        """
+        with self._lock:
+            entries = []
+            for entry in self._entries():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+    def clear(self):
+        """
+        For removing all cached images and resetting the hit and miss counters. Other files in the directory are
+        kept.
+
+        :return: Nothing
+        """
+        with self._lock:
+            for entry in self._entries():
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            self.hits = 0
+            self.misses = 0
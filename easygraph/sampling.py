@@ -0,0 +1,174 @@
+"""
+Sampling policies for high-frequency instrumentation (see Graph(sampling=...)). Each call of add_node(), step() or
+of a function decorated with timed() asks the policy whether it is recorded. Skipped calls only increase a counter,
+sampled calls are recorded as usual. The calls are counted per key (the name of the node, for timed() the name of
+the function), thus every instrumented step is sampled on its own:
+
+    g = Graph(measure_time=True, aggregate=True, sampling=EveryNth(100))
+
+The labels show how many calls were sampled, and the count, total and mean time are estimated for all calls. For
+that, the policy gives each sampled call its weight, the number of calls it stands for (the inverse of its
+probability of being sampled), thus also policies which sample some calls more often than others are scaled
+correctly.
+"""
+import abc
+import threading
+import time
+
+
+class Sampling(abc.ABC):
+    """
+    Base class of the sampling policies. A policy counts per key how many calls were seen and how many of them were
+    sampled. Use one policy per graph.
+    """
+
+    def __init__(self):
+        # key -> [seen, sampled]. The lists are shared with the statistics of the sampled nodes, thus the labels
+        # always show the current counts.
+        self.counts: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+        # True if calls were counted since the graph was last created
+        self.changed = False
+
+
+    def sample(self, key:str) -> float:
+        """
+        :param key: The name of the node (for timed(): of the function)
+        :return: The weight of the call if it is recorded, thus the number of calls it stands for, or 0 if not
+        """
+        with self._lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0, 0]
+            counts[0] += 1
+            self.changed = True
+            weight = self._take(key, counts[0])
+            if weight:
+                counts[1] += 1
+            return weight
+
+
+    @abc.abstractmethod
+    def _take(self, key:str, seen:int) -> float:
+        """
+        Called while holding the lock.
+
+        :param key: The key of the call
+        :param seen: The number of calls of the key so far, including this call
+        :return: The weight if this call is sampled, 0 if not
+        """
+
+
+    def spent(self, nanoseconds:int):
+        """
+        Called by the graph with the time it took to record sampled calls.
+
+        :return: Nothing
+        """
+        pass
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class EveryNth(Sampling):
+    """
+    Samples the first call and then every n-th call (1-in-N).
+    """
+
+    def __init__(self, n:int):
+        super().__init__()
+        if n < 1:
+            print(f"Error: n needs to be minimum 1! But you have chosen {n}")
+            n = 1
+        self.n = n
+
+
+    def _take(self, key:str, seen:int) -> float:
+        return self.n if (seen - 1) % self.n == 0 else 0
+
+
+class FirstThenEvery(Sampling):
+    """
+    Samples the first k calls, thus the start is recorded completely, and then every n-th call. The first k calls
+    have the weight 1, the later ones n.
+    """
+
+    def __init__(self, k:int, n:int):
+        super().__init__()
+        if n < 1:
+            print(f"Error: n needs to be minimum 1! But you have chosen {n}")
+            n = 1
+        self.k = k
+        self.n = n
+
+
+    def _take(self, key:str, seen:int) -> float:
+        if seen <= self.k:
+            return 1
+        return self.n if (seen - self.k) % self.n == 0 else 0
+
+
+class Probability(Sampling):
+    """
+    Samples each call with the probability p. With a seed, the same calls are sampled in each run.
+    """
+
+    def __init__(self, p:float, seed:int|None=None):
+        super().__init__()
+        # Imported here, since random is only needed for this policy
+        import random
+        if not 0 < p <= 1:
+            print(f"Error: p needs to be in (0, 1]! But you have chosen {p}")
+            p = min(max(p, 1e-9), 1.0)
+        self.p = p
+        self._random = random.Random(seed)
+
+
+    def _take(self, key:str, seen:int) -> float:
+        return 1 / self.p if self._random.random() < self.p else 0
+
+
+class TimeBudget(Sampling):
+    """
+    Samples calls as long as recording them took less than 'seconds' in the current second, thus the overhead of
+    the recording is bounded, e.g. TimeBudget(0.01) for 1 % of the time. The budget is shared by all keys.
+
+    Which calls are sampled depends on the load, thus a sampled call stands for itself and the calls of its key
+    skipped since the previous sampled call. Calls after the last sampled call of a key are only in its counts.
+    """
+
+    def __init__(self, seconds:float):
+        super().__init__()
+        self.budget = int(seconds * 1e9)
+        self._window = time.perf_counter_ns()
+        self._spent = 0
+        # key -> the number of calls of the key when it was sampled last
+        self._last: dict[str, int] = {}
+
+
+    def _take(self, key:str, seen:int) -> float:
+        now = time.perf_counter_ns()
+        if now - self._window >= 1_000_000_000:
+            self._window = now
+            self._spent = 0
+        if self._spent >= self.budget:
+            return 0
+        weight = seen - self._last.get(key, 0)
+        self._last[key] = seen
+        return weight
+
+
+    def spent(self, nanoseconds:int):
+        # Same lock as sample(), which resets the spent time in _take()
+        with self._lock:
+            self._spent += nanoseconds
@@ -0,0 +1,225 @@
+"""
+Running statistics of nodes which are recorded repeatedly, e.g. in loops (see Graph(aggregate=True)). The memory
+does not grow with the number of recordings: the quantiles are estimated with the P² algorithm (Jain & Chlamtac,
+1985), which keeps only five markers per quantile.
+"""
+import math
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P² algorithm. Exact as long as fewer than five values were added.
+    """
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p:float):
+        """
+        * p: The quantile, e.g. 0.5 for the median or 0.95
+
+        """
+        self.p = p
+        self.heights: list[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+
+    def add(self, x:float):
+        """
+        :param x: The new value
+        :return: Nothing
+        """
+        q = self.heights
+
+        # 1) The first five values are only collected
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # 2) Find the cell of the value and adjust the extreme markers
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # 3) Move the three middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise parabolic prediction, or linear if it would leave the neighbouring markers
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                                                         + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+
+    def value(self) -> float:
+        """
+        :return: The estimated quantile, NaN if no value was added
+        """
+        q = self.heights
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            return q[min(len(q) - 1, max(0, math.ceil(self.p * len(q)) - 1))]
+        return q[2]
+
+
+class RunningStats:
+    """
+    Count, total, minimum, maximum, mean, median and 95th percentile of the measured times of a node.
+    The count includes recordings without a measured time, all other values only the measured ones.
+
+    If the node was sampled (Graph(sampling=...)), 'sampling' is the list [seen, sampled] of the calls of its key,
+    and each recording has the weight given by the sampling policy, the number of calls it stands for. The
+    estimated count, total and mean of all calls are the weighted sums, the other values are estimated by the
+    sampled recordings.
+    """
+    __slots__ = ("count", "measured", "total", "weighted_count", "weighted_measured", "weighted_total", "min", "max",
+                 "_p50", "_p95", "sampling")
+
+    def __init__(self):
+        self.count = 0
+        self.measured = 0
+        self.total = 0.0
+        self.weighted_count = 0.0
+        self.weighted_measured = 0.0
+        self.weighted_total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._p50 = P2Quantile(0.5)
+        self._p95 = P2Quantile(0.95)
+        self.sampling: list[int]|None = None
+
+
+    def add(self, value:float|None, weight:float=1):
+        """
+        :param value: The measured time in seconds, or None if the time was not measured
+        :param weight: The number of calls the recording stands for, 1 if not sampled
+        :return: Nothing
+        """
+        self.count += 1
+        self.weighted_count += weight
+        if value is None or value != value:
+            return
+        self.measured += 1
+        self.total += value
+        self.weighted_measured += weight
+        self.weighted_total += weight * value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self._p50.add(value)
+        self._p95.add(value)
+
+
+    @property
+    def mean(self) -> float:
+        """
+        The mean of the measured times, weighted if sampled.
+        """
+        return self.weighted_total / self.weighted_measured if self.measured else math.nan
+
+
+    @property
+    def p50(self) -> float:
+        return self._p50.value()
+
+
+    @property
+    def p95(self) -> float:
+        return self._p95.value()
+
+
+    @property
+    def scale(self) -> float:
+        """
+        The mean number of calls per recording, 1.0 if not sampled.
+        """
+        return self.weighted_count / self.count if self.count else 1.0
+
+
+    @property
+    def estimated_count(self) -> int:
+        return round(self.weighted_count)
+
+
+    @property
+    def estimated_total(self) -> float:
+        """
+        The estimated total time of all calls, thus the total of the recordings if not sampled.
+        """
+        return self.weighted_total
+
+
+    def state(self) -> list:
+        """
+        :return: The state as JSON compatible list, see from_state()
+        """
+        return [self.count, self.measured, self.total,
+                self.min if self.measured else None, self.max if self.measured else None,
+                [self._p50.heights, self._p50.positions, self._p50.desired],
+                [self._p95.heights, self._p95.positions, self._p95.desired],
+                list(self.sampling) if self.sampling is not None else None,
+                [self.weighted_count, self.weighted_measured, self.weighted_total]]
+
+
+    @classmethod
+    def from_state(cls, state:list) -> "RunningStats":
+        """
+        :param state: The list of state()
+        :return: The restored statistics
+        """
+        stats = cls()
+        stats.count, stats.measured, stats.total, minimum, maximum, p50, p95 = state[:7]
+        if len(state) > 7:
+            stats.sampling = state[7]
+        # Older states have no weights: each recording stands for the same number of calls of its key
+        if len(state) > 8:
+            stats.weighted_count, stats.weighted_measured, stats.weighted_total = state[8]
+        else:
+            scale = stats.sampling[0] / stats.sampling[1] if stats.sampling and stats.sampling[1] else 1.0
+            stats.weighted_count = stats.count * scale
+            stats.weighted_measured = stats.measured * scale
+            stats.weighted_total = stats.total * scale
+        if stats.measured:
+            stats.min, stats.max = minimum, maximum
+        for quantile, (heights, positions, desired) in ((stats._p50, p50), (stats._p95, p95)):
+            quantile.heights, quantile.positions, quantile.desired = heights, positions, desired
+        return stats
+
+
+    def summary(self) -> dict:
+        """
+        :return: dict with 'count', 'total', 'min', 'max', 'mean', 'p50' and 'p95' (times in seconds, None if
+                 no time was measured). If sampled, the count, the total and the mean are estimated for all calls,
+                 and also 'recorded' (the number of recordings) and 'rate' (recordings / estimated calls) are
+                 included.
+        """
+        count = self.estimated_count
+        if not self.measured:
+            summary = {"count": count, "total": None, "min": None, "max": None, "mean": None, "p50": None, "p95": None}
+        else:
+            summary = {"count": count, "total": self.estimated_total, "min": self.min, "max": self.max,
+                       "mean": self.mean, "p50": self.p50, "p95": self.p95}
+        if self.sampling is not None:
+            summary["recorded"] = self.count
+            summary["rate"] = 1 / self.scale
+        return summary
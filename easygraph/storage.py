@@ -0,0 +1,346 @@
+"""
+Compact storage of the nodes, edges and clusters of a Graph. Names are interned to integer ids, the values of
+the nodes are kept in columns (arrays where possible) and the edges in an explicit edge list. The read-only
+views provide the previous dict-of-dicts access (graph.nodes[name]["cluster"], ...).
+"""
+from array import array
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from .formatting import format_delta
+
+
+NAN = float("nan")
+
+# The memory of a node which was not measured: (change of the allocated memory, peak, top allocation sites)
+NO_MEMORY = (NAN, NAN, None)
+
+# The form in which the previous nodes were given for a node: None, a single name or a list of names
+CONNECT_NONE, CONNECT_SINGLE, CONNECT_LIST = 0, 1, 2
+
+
+class ClusterStore:
+    """
+    The clusters, each with an id (position in the columns), a description and the name of its supercluster.
+    """
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.text: list[str] = []
+        self.supercluster: list[str|None] = []
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def add(self, name:str, text:str, supercluster:str|None) -> int:
+        """
+        :return: The id of the new cluster
+        """
+        i = self.ids[name] = len(self.names)
+        self.names.append(name)
+        self.text.append(text)
+        self.supercluster.append(supercluster)
+        return i
+
+
+    def __getstate__(self):
+        # The ids are not pickled, since they follow from the names
+        return {"names": self.names, "text": self.text, "supercluster": self.supercluster}
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+
+class NodeStore:
+    """
+    The nodes and edges in columns. A node is represented by its id, thus its position in the columns.
+
+    * cluster: id of the cluster, -1 for no cluster
+    * text: the finished HTML label (shared with the label cache), or None
+    * time_absolute, time_relative: measured times in seconds, NaN if not measured
+    * duration: exact duration of a timed step (Graph.step(), Graph.timed()) in nanoseconds, -1 if not timed
+    * memory_current, memory_peak: change of the allocated memory and peak above the start in bytes, NaN if
+      not measured (Graph(measure_memory=True))
+    * The edges are kept in the columns edge_src, edge_dst. The edges into the same node are chained via
+      edge_next (-1 at the end), starting at in_first and ending at in_last of that node. Likewise, the edges
+      out of the same node are chained via out_next, starting at out_first and ending at out_last. Thus, the
+      predecessors and successors of a node are found in O(degree).
+    """
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.text: list[str|None] = []
+        self.cluster = array('i')
+        self.width = array('d')
+        self.time_absolute = array('d')
+        self.time_relative = array('d')
+        self.connect = array('b')
+        self.duration = array('q')
+        self.memory_current = array('d')
+        self.memory_peak = array('d')
+
+        self.edge_src = array('i')
+        self.edge_dst = array('i')
+        self.edge_next = array('i')
+        self.in_first = array('i')
+        self.in_last = array('i')
+        self.out_next = array('i')
+        self.out_first = array('i')
+        self.out_last = array('i')
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def add(self, name:str, cluster:int, text:str|None, width:float, time_absolute:float, time_relative:float,
+            connect:int, duration:int=-1, memory_current:float=NAN, memory_peak:float=NAN) -> int:
+        """
+        :return: The id of the new node
+        """
+        i = self.ids[name] = len(self.names)
+        self.names.append(name)
+        self.text.append(text)
+        self.cluster.append(cluster)
+        self.width.append(width)
+        self.time_absolute.append(time_absolute)
+        self.time_relative.append(time_relative)
+        self.connect.append(connect)
+        self.duration.append(duration)
+        self.memory_current.append(memory_current)
+        self.memory_peak.append(memory_peak)
+        self.in_first.append(-1)
+        self.in_last.append(-1)
+        self.out_first.append(-1)
+        self.out_last.append(-1)
+        return i
+
+
+    def add_edge(self, src:int, dst:int):
+        """
+        For adding an edge from node id src to node id dst.
+
+        :return: Nothing
+        """
+        e = len(self.edge_src)
+        self.edge_src.append(src)
+        self.edge_dst.append(dst)
+        self.edge_next.append(-1)
+        if self.in_last[dst] < 0:
+            self.in_first[dst] = e
+        else:
+            self.edge_next[self.in_last[dst]] = e
+        self.in_last[dst] = e
+        self._chain_out(e)
+
+
+    def _chain_out(self, e:int):
+        """
+        For appending edge e to the chain of the edges out of its source node.
+
+        :return: Nothing
+        """
+        src = self.edge_src[e]
+        self.out_next.append(-1)
+        if self.out_last[src] < 0:
+            self.out_first[src] = e
+        else:
+            self.out_next[self.out_last[src]] = e
+        self.out_last[src] = e
+
+
+    def index_successors(self):
+        """
+        For building the chains of the outgoing edges from edge_src, e.g. after loading a file, which only
+        contains the chains of the incoming edges.
+
+        :return: Nothing
+        """
+        n = len(self.names)
+        self.out_next = array('i')
+        self.out_first = array('i', [-1]) * n
+        self.out_last = array('i', [-1]) * n
+        for e in range(len(self.edge_src)):
+            self._chain_out(e)
+
+
+    def predecessors(self, i:int) -> list[int]:
+        """
+        :return: The ids of the nodes with an edge into node i, in the order the edges were added
+        """
+        result = []
+        e = self.in_first[i]
+        while e >= 0:
+            result.append(self.edge_src[e])
+            e = self.edge_next[e]
+        return result
+
+
+    def successors(self, i:int) -> list[int]:
+        """
+        :return: The ids of the nodes with an edge from node i, in the order the edges were added
+        """
+        result = []
+        e = self.out_first[i]
+        while e >= 0:
+            result.append(self.edge_dst[e])
+            e = self.out_next[e]
+        return result
+
+
+    def extend(self, other:"NodeStore", names:list[str], cluster_map:list[int], time_shift:float=0.0):
+        """
+        For appending all nodes and edges of another store at once. The node with id j in the other store
+        gets the id len(self) + j.
+
+        :param other: The other NodeStore
+        :param names: The names of the nodes of the other store in this store (e.g. renamed due to conflicts)
+        :param cluster_map: For each cluster id of the other store the cluster id in this store
+        :param time_shift: Seconds added to the absolute times, since the start times of the graphs differ
+        :return: Nothing
+        """
+        n0, e0 = len(self.names), len(self.edge_src)
+        self.ids.update(zip(names, range(n0, n0 + len(names))))
+        self.names.extend(names)
+        self.text.extend(other.text)
+        self.cluster.extend(cluster_map[c] if c >= 0 else -1 for c in other.cluster)
+        self.width.extend(other.width)
+        self.time_absolute.extend(t + time_shift for t in other.time_absolute)
+        self.time_relative.extend(other.time_relative)
+        self.connect.extend(other.connect)
+        self.duration.extend(other.duration)
+        self.memory_current.extend(other.memory_current)
+        self.memory_peak.extend(other.memory_peak)
+
+        self.edge_src.extend(j + n0 for j in other.edge_src)
+        self.edge_dst.extend(j + n0 for j in other.edge_dst)
+        self.edge_next.extend(e + e0 if e >= 0 else -1 for e in other.edge_next)
+        self.in_first.extend(e + e0 if e >= 0 else -1 for e in other.in_first)
+        self.in_last.extend(e + e0 if e >= 0 else -1 for e in other.in_last)
+        self.out_next.extend(e + e0 if e >= 0 else -1 for e in other.out_next)
+        self.out_first.extend(e + e0 if e >= 0 else -1 for e in other.out_first)
+        self.out_last.extend(e + e0 if e >= 0 else -1 for e in other.out_last)
+
+
+    def __getstate__(self):
+        # The ids are not pickled, since they follow from the names
+        state = self.__dict__.copy()
+        del state["ids"]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+
+    def has_time(self, i:int) -> bool:
+        """
+        :return: True if the time was measured for node i
+        """
+        return self.time_absolute[i] == self.time_absolute[i] and self.time_relative[i] == self.time_relative[i]
+
+
+    def has_memory(self, i:int) -> bool:
+        """
+        :return: True if the memory was measured for node i
+        """
+        return self.memory_peak[i] == self.memory_peak[i]
+
+
+class NodesView(Mapping):
+    """
+    Read-only view of the nodes: name -> {"connect_from", "cluster", "text", "time_absolute", "time_relative",
+    "duration", "stats", "memory", "width"}. The flush function is called before each access, e.g. to store
+    pending steps.
+    """
+
+    def __init__(self, nodes:NodeStore, clusters:ClusterStore, flush=None, stats:dict|None=None,
+                 memory_top:dict|None=None):
+        self._nodes = nodes
+        self._clusters = clusters
+        self._stats = stats if stats is not None else {}
+        self._memory_top = memory_top if memory_top is not None else {}
+        self._flush = flush if flush is not None else (lambda: None)
+
+
+    def __getitem__(self, name:str):
+        self._flush()
+        nodes = self._nodes
+        i = nodes.ids[name]
+
+        predecessors = [nodes.names[p] for p in nodes.predecessors(i)]
+        if nodes.connect[i] == CONNECT_LIST:
+            connect_from = predecessors
+        else:
+            connect_from = predecessors[0] if predecessors else None
+
+        measured = nodes.has_time(i)
+        return MappingProxyType({"connect_from": connect_from,
+                                 "cluster": self._clusters.names[nodes.cluster[i]] if nodes.cluster[i] >= 0 else None,
+                                 "text": nodes.text[i],
+                                 "time_absolute": format_delta(nodes.time_absolute[i]) if measured else None,
+                                 "time_relative": format_delta(nodes.time_relative[i]) if measured else None,
+                                 "duration": nodes.duration[i] if nodes.duration[i] >= 0 else None,
+                                 "stats": self._stats[i].summary() if i in self._stats else None,
+                                 "memory": {"current": int(nodes.memory_current[i]),
+                                            "peak": int(nodes.memory_peak[i]),
+                                            "top": self._memory_top.get(i)} if nodes.has_memory(i) else None,
+                                 "width": nodes.width[i]})
+
+
+    def __iter__(self):
+        self._flush()
+        return iter(self._nodes.names)
+
+
+    def __len__(self) -> int:
+        self._flush()
+        return len(self._nodes)
+
+
+    def __contains__(self, name) -> bool:
+        self._flush()
+        return name in self._nodes.ids
+
+
+    def keys(self):
+        self._flush()
+        return self._nodes.ids.keys()
+
+
+class ClustersView(Mapping):
+    """
+    Read-only view of the clusters: name -> {"text", "supercluster"}.
+    """
+
+    def __init__(self, clusters:ClusterStore):
+        self._clusters = clusters
+
+
+    def __getitem__(self, name:str):
+        i = self._clusters.ids[name]
+        return MappingProxyType({"text": self._clusters.text[i],
+                                 "supercluster": self._clusters.supercluster[i]})
+
+
+    def __iter__(self):
+        return iter(self._clusters.names)
+
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+
+    def __contains__(self, name) -> bool:
+        return name in self._clusters.ids
+
+
+    def keys(self):
+        return self._clusters.ids.keys()
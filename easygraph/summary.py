@@ -0,0 +1,148 @@
+"""
+For collapsing big or deeply nested clusters into single summary nodes (see Graph.create(max_cluster_nodes=...,
+max_depth=...)). Thus, the layout of graphviz stays fast for big graphs. Everything is computed in one pass over
+the clusters, the nodes and the edges.
+"""
+from .formatting import TITLE_COLOURS
+
+
+class ClusterSummary:
+    """
+    The aggregated content of a collapsed cluster, including all nested clusters.
+
+    * nodes: number of nodes
+    * clusters: number of nested clusters
+    * status: number of nodes per title colour ('green', 'yellow', 'red') appearing in their labels
+    * time: sum of the measured times in seconds (durations of steps, totals of repeated nodes), None if no
+      time was measured
+    """
+    __slots__ = ("nodes", "clusters", "status", "time")
+
+    def __init__(self):
+        self.nodes = 0
+        self.clusters = 0
+        self.status = {}
+        self.time = None
+
+
+class Collapsed:
+    """
+    The graph with collapsed clusters:
+
+    * summaries: id of each collapsed cluster -> ClusterSummary
+    * owner: for each cluster id the id of the collapsed cluster containing it (itself if collapsed), -1 if visible
+    * edges: the edges between the visible nodes and the collapsed clusters as dict
+      (source, target) -> number of edges, where a node is given by its id and a collapsed cluster by
+      ('cluster', id), in the order they were added
+    """
+
+    def __init__(self, summaries:dict, owner:list[int], edges:dict):
+        self.summaries = summaries
+        self.owner = owner
+        self.edges = edges
+
+
+def _status(text:str|None, cache:dict) -> str|None:
+    """
+    :return: The title colour shown in the label, None if the label has no title
+    """
+    if text is None:
+        return None
+    status = cache.get(text, False)
+    if status is False:
+        status = next((name for name, colour in TITLE_COLOURS.items() if f'BGCOLOR="{colour}"' in text), None)
+        cache[text] = status
+    return status
+
+
+def collapse(graph, max_nodes:int|None=None, max_depth:int|None=None, expand=()) -> Collapsed:
+    """
+    For deciding which clusters are collapsed and summarising them.
+
+    * A cluster is collapsed if it contains more than max_nodes nodes (including nested clusters) or is nested
+      max_depth levels or deeper (0 for the top-level clusters). The clusters in it are then hidden.
+    * The clusters in expand and their superclusters are never collapsed, thus only the content of e.g. a big
+      cluster is shown, with its big subclusters collapsed.
+
+    :param graph: The easygraph Graph object
+    :param max_nodes: The maximal number of nodes of a shown cluster, None for no limit
+    :param max_depth: The maximal depth of a shown cluster, None for no limit
+    :param expand: Names of clusters which are shown in any case
+    :return: The collapsed graph
+    """
+    nodes, clusters = graph._nodes, graph._clusters
+    depths, children = graph._cluster_depth, graph._cluster_children
+    stats = graph._stats
+
+    # 1) The clusters which are expanded, including all superclusters
+    expanded = set()
+    for name in expand:
+        if name not in clusters.ids:
+            print(f"Error: The following cluster to expand does not exist: {name}")
+        while name is not None and name in clusters.ids and name not in expanded:
+            expanded.add(name)
+            name = clusters.supercluster[clusters.ids[name]]
+
+    # 2) The number of nodes directly in each cluster, then including the nested clusters (bottom up)
+    size = [0] * len(clusters)
+    for c in nodes.cluster:
+        if c >= 0:
+            size[c] += 1
+    # The clusters in the order of the cluster index (depth-first), thus superclusters before their subclusters
+    order = []
+    stack = list(reversed(children[None]))
+    while stack:
+        name = stack.pop()
+        order.append(name)
+        stack.extend(reversed(children.get(name, ())))
+    for name in reversed(order):
+        sup = clusters.supercluster[clusters.ids[name]]
+        if sup is not None:
+            size[clusters.ids[sup]] += size[clusters.ids[name]]
+
+    # 3) The collapsed clusters (top down), thus each cluster gets the outermost collapsed cluster containing it
+    owner = [-1] * len(clusters)
+    summaries = {}
+    for name in order:
+        c = clusters.ids[name]
+        sup = clusters.supercluster[c]
+        if sup is not None and owner[clusters.ids[sup]] >= 0:
+            owner[c] = owner[clusters.ids[sup]]
+            summaries[owner[c]].clusters += 1
+        elif name not in expanded and ((max_nodes is not None and size[c] > max_nodes)
+                                       or (max_depth is not None and depths[name] >= max_depth)):
+            owner[c] = c
+            summaries[c] = ClusterSummary()
+
+    # 4) Sum up the nodes of the collapsed clusters
+    labels = {}
+    for i, c in enumerate(nodes.cluster):
+        if c < 0 or owner[c] < 0:
+            continue
+        summary = summaries[owner[c]]
+        summary.nodes += 1
+        status = _status(nodes.text[i], labels)
+        if status is not None:
+            summary.status[status] = summary.status.get(status, 0) + 1
+        if i in stats and stats[i].measured:
+            t = stats[i].estimated_total
+        elif nodes.duration[i] >= 0:
+            t = nodes.duration[i] / 1e9
+        elif nodes.has_time(i):
+            t = nodes.time_relative[i]
+        else:
+            continue
+        summary.time = t if summary.time is None else summary.time + t
+
+    # 5) Reroute the edges to the collapsed clusters. Edges inside a collapsed cluster are dropped.
+    def end(i):
+        c = nodes.cluster[i]
+        return ("cluster", owner[c]) if c >= 0 and owner[c] >= 0 else i
+
+    edges = {}
+    for src, dst in zip(nodes.edge_src, nodes.edge_dst):
+        key = (end(src), end(dst))
+        if key[0] != key[1] or not isinstance(key[0], tuple):
+            edges[key] = edges.get(key, 0) + 1
+
+    return Collapsed(summaries, owner, edges)
@@ -0,0 +1,203 @@
+"""
+For timing blocks of code and functions as nodes of a Graph. The time is taken with time.perf_counter_ns() once
+at the start and once at the end. The node is only queued at the end and stored with the next access of the
+graph, thus the timed code is hardly slowed down.
+"""
+import functools
+import itertools
+import sys
+import threading
+import weakref
+from time import perf_counter_ns
+
+from .storage import NO_MEMORY
+
+
+# The maximal number of queued steps. With more, the steps are stored at the end of the step, thus the memory stays
+# bounded for steps in tight loops, e.g. with aggregate=True.
+MAX_PENDING = 1024
+
+
+def _current_task():
+    """
+    :return: The running asyncio task, None outside of tasks. asyncio is not imported for it, since without
+             asyncio being imported there are no tasks.
+    """
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None or asyncio._get_running_loop() is None:
+        return None
+    return asyncio.current_task()
+
+
+class _ThreadChain(threading.local):
+    """
+    The previous node of each thread. Each thread starts with the default of the graph.
+    """
+
+    def __init__(self, default:tuple):
+        self.previous = default
+
+
+class Chain:
+    """
+    The previous node for 'auto' chaining and its time (name, time) of one graph, per thread and per asyncio task.
+    It is part of the graph, thus freed with it, and reading or changing it does not depend on the number of
+    graphs. The entries of the tasks are weak, thus freed with the tasks. A task without an entry yet continues the
+    chain of its thread.
+    """
+    __slots__ = ("threads", "tasks")
+
+    def __init__(self, default:tuple=(None, None)):
+        self.threads = _ThreadChain(default)
+        self.tasks = weakref.WeakKeyDictionary()
+
+
+    def get(self) -> tuple:
+        """
+        :return: The tuple (name, time) of the current thread or task
+        """
+        task = _current_task()
+        if task is not None:
+            previous = self.tasks.get(task)
+            if previous is not None:
+                return previous
+        return self.threads.previous
+
+
+    def set(self, previous:tuple):
+        """
+        :param previous: The tuple (name, time) of the current thread or task
+        :return: Nothing
+        """
+        task = _current_task()
+        if task is None:
+            self.threads.previous = previous
+        else:
+            self.tasks[task] = previous
+
+
+    def touch(self, t:int):
+        """
+        For setting the time of the current thread or task, keeping the previous node, e.g. for calls which are
+        not sampled.
+
+        :param t: The time in nanoseconds of time.perf_counter_ns()
+        :return: Nothing
+        """
+        task = _current_task()
+        if task is None:
+            threads = self.threads
+            threads.previous = (threads.previous[0], t)
+        else:
+            previous = self.tasks.get(task)
+            if previous is None:
+                previous = self.threads.previous
+            self.tasks[task] = (previous[0], t)
+
+
+    def advance(self, name:str, t:int|None=None) -> tuple:
+        """
+        For continuing the chain of the current thread or task with a node. Same as get() and set(), but in one
+        call, since Step.__exit__() is the hot path.
+
+        :param name: The name of the node
+        :param t: The time of the node, None for keeping the time of the previous node
+        :return: The previous tuple (name, time)
+        """
+        task = _current_task()
+        if task is None:
+            threads = self.threads
+            previous = threads.previous
+            # Unchanged e.g. for the same step in a loop without measure_time
+            if t is not None or previous[0] != name:
+                threads.previous = (name, previous[1] if t is None else t)
+            return previous
+        previous = self.tasks.get(task)
+        if previous is None:
+            previous = self.threads.previous
+        self.tasks[task] = (name, previous[1] if t is None else t)
+        return previous
+
+
+class Step:
+    """
+    Context manager returned by Graph.step(). Can be used once.
+    """
+    __slots__ = ("graph", "name", "connect_from", "node", "key", "weight", "memory", "start")
+
+    def __init__(self, graph, name:str, connect_from, node:tuple, key:str|None=None, weight:float=1):
+        """
+        * node: the further arguments of add_node() (text, cluster, title_colour, width), only needed when
+          the step is stored.
+        * key: the key the step was sampled by, None without sampling.
+        * weight: the number of calls the sampled step stands for, see Sampling.sample().
+
+        """
+        self.graph = graph
+        self.name = name
+        self.connect_from = connect_from
+        self.node = node
+        self.key = key
+        self.weight = weight
+
+
+    def __enter__(self):
+        if self.graph.measure_memory:
+            self.memory = self.graph._memory.mark()
+        self.start = perf_counter_ns()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = perf_counter_ns()
+        graph = self.graph
+        memory = graph._memory.since(self.memory) if graph.measure_memory else NO_MEMORY
+
+        # Only the 'auto' chaining is resolved right away, since it depends on the current thread / task.
+        # Everything else is done when the graph stores the queued steps (Graph._flush_steps()).
+        # The time of the chain is kept in nanoseconds, thus it is stored without conversion.
+        previous_node = graph._chain.advance(self.name, end if graph.measure_time else None)[0]
+        if self.connect_from != "auto":
+            previous_node = self.connect_from
+        pending = graph._pending_steps
+        pending.append((self, previous_node, end, memory))
+        if len(pending) >= MAX_PENDING:
+            graph._flush_steps()
+        return False
+
+
+def timed(graph, name:str|None=None, **kwargs):
+    """
+    For the decorator Graph.timed(). Each call of the decorated function is timed as a step. The first call
+    is named 'name', further calls 'name (2)', 'name (3)', ... If the graph aggregates (Graph(aggregate=True)),
+    all calls are named 'name', thus they update the statistics of one node.
+
+    :param graph: The Graph object
+    :param name: The name of the nodes, by default the qualified name of the function
+    :param kwargs: Further arguments of Graph.step(), e.g. text, cluster
+    :return: The decorator
+    """
+    def decorator(func):
+        # Imported here, since inspect is slow to import
+        import inspect
+        base = name if name is not None else func.__qualname__
+        calls = itertools.count(1)
+
+        def step():
+            k = next(calls)
+            # The calls are sampled by the name of the function, not by the name of each node
+            return graph.step(base if k == 1 or graph.aggregate else f"{base} ({k})", sample_key=base, **kwargs)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kw):
+                with step():
+                    return await func(*args, **kw)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kw):
+                with step():
+                    return func(*args, **kw)
+        return wrapper
+
+    return decorator